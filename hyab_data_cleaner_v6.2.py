@@ -17,86 +17,124 @@ Features:
 
 import streamlit as st
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
 import re
 from datetime import datetime
-from io import BytesIO
-from collections import defaultdict
+from io import BytesIO, StringIO
 import json
-import requests
+import traceback
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    json_loads = orjson.loads  # accepts bytes directly, parses in C
+    def json_dumps(obj): return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj): return json.dumps(obj, default=np.ndarray.tolist)  # chart series are float arrays
+
+
+INDUSTRY_KEYWORDS = {
+    'Automotive/EV': ['volvo', 'scania', 'autoliv', 'automotive', 'car-o-liner', 'motor', 'vehicle', 'polestar'],
+    'Manufacturing/Industrial': ['manufacturing', 'industri', 'produktion', 'verkstad', 'maskin', 'tool', 'sandvik', 'atlas copco', 'skf', 'abb', 'seco tool'],
+    'Electronics/Tech': ['elektr', 'electronic', 'tech', 'sensor', 'circuit', 'pcb', 'kitron', 'zollner', 'gpv', 'keba', 'automation', 'amada'],
+    'Medical/Healthcare': ['medical', 'medic', 'health', 'pharma', 'hospital', 'dental', 'medi', 'gambro'],
+    'Energy/Wind': ['energy', 'energi', 'wind', 'solar', 'power', 'kraft', 'vattenfall', 'nibe', 'heat pump', 'linak'],
+    'Mining/Steel': ['mining', 'gruv', 'steel', 'stål', 'metall', 'metal', 'ssab', 'lkab', 'boliden', 'metso'],
+    'Food/Packaging': ['food', 'livsmedel', 'tetra pak', 'packaging', 'förpackning', 'metos'],
+    'Construction/Building': ['bygg', 'construction', 'building', 'fastighet', 'property'],
+    'Defense/Aerospace': ['defense', 'försvar', 'military', 'aerospace', 'flyg', 'saab'],
+    'Logistics/Transport': ['transport', 'logist', 'shipping', 'frakt', 'truckcam'],
+}
 
+# One alternative per industry, tried in the order above so the first matching
+# industry wins (a plain alternation would pick the leftmost keyword instead)
+INDUSTRY_RE = re.compile('|'.join(
+    f"(?=.*?(?:{'|'.join(re.escape(kw) for kw in keywords)}))(?P<g{i}>)"
+    for i, keywords in enumerate(INDUSTRY_KEYWORDS.values())
+), re.DOTALL)
+INDUSTRY_GROUPS = list(INDUSTRY_KEYWORDS)
+# Market alignment shown next to each sector in the dashboard's industry table
+HIGH_GROWTH_INDUSTRIES = frozenset({'Energy/Wind', 'Automotive/EV', 'Mining/Steel'})
+GROWING_INDUSTRIES = frozenset({'Defense/Aerospace', 'Manufacturing/Industrial'})
+# Every label classify_customer_industry can return, for fixed-shape aggregation
+INDUSTRY_LIST = INDUSTRY_GROUPS + ['Other/General']
+INDUSTRY_TO_IDX = {name: i for i, name in enumerate(INDUSTRY_LIST)}
+
+
+@st.cache_resource(show_spinner=False)
+def _industry_memo():
+    """Customer name -> industry, shared across reruns (a module-level cache is rebuilt on every rerun)"""
+    return {}
 
 def classify_customer_industry(name):
     """Classify customer by industry based on name keywords"""
-    if not name or str(name).strip() == '':
-        return 'Other/General'
-    
-    name_lower = str(name).lower()
-    
-    industry_keywords = {
-        'Automotive/EV': ['volvo', 'scania', 'autoliv', 'automotive', 'car-o-liner', 'motor', 'vehicle', 'polestar'],
-        'Manufacturing/Industrial': ['manufacturing', 'industri', 'produktion', 'verkstad', 'maskin', 'tool', 'sandvik', 'atlas copco', 'skf', 'abb', 'seco tool'],
-        'Electronics/Tech': ['elektr', 'electronic', 'tech', 'sensor', 'circuit', 'pcb', 'kitron', 'zollner', 'gpv', 'keba', 'automation', 'amada'],
-        'Medical/Healthcare': ['medical', 'medic', 'health', 'pharma', 'hospital', 'dental', 'medi', 'gambro'],
-        'Energy/Wind': ['energy', 'energi', 'wind', 'solar', 'power', 'kraft', 'vattenfall', 'nibe', 'heat pump', 'linak'],
-        'Mining/Steel': ['mining', 'gruv', 'steel', 'stål', 'metall', 'metal', 'ssab', 'lkab', 'boliden', 'metso'],
-        'Food/Packaging': ['food', 'livsmedel', 'tetra pak', 'packaging', 'förpackning', 'metos'],
-        'Construction/Building': ['bygg', 'construction', 'building', 'fastighet', 'property'],
-        'Defense/Aerospace': ['defense', 'försvar', 'military', 'aerospace', 'flyg', 'saab'],
-        'Logistics/Transport': ['transport', 'logist', 'shipping', 'frakt', 'truckcam'],
-    }
-    
-    for industry, keywords in industry_keywords.items():
-        for kw in keywords:
-            if kw in name_lower:
-                return industry
-    return 'Other/General'
+    memo = _industry_memo()
+    industry = memo.get(name)
+    if industry is None:
+        if not name or str(name).strip() == '':
+            industry = 'Other/General'
+        else:
+            m = INDUSTRY_RE.match(str(name).lower())
+            industry = INDUSTRY_GROUPS[m.lastindex - 1] if m else 'Other/General'
+        if len(memo) >= 8192: memo.clear()
+        memo[name] = industry
+    return industry
 
 
-def analyze_industries(cust_data, curr_ltm_col, prev_ltm_col):
-    """Analyze customer cohorts by industry"""
+def industry_rollup(names, curr, prev):
+    """Per-industry LTM totals, churned/new revenue and customer counts, largest current LTM first"""
     results = []
-    industry_stats = defaultdict(lambda: {'curr': 0, 'prev': 0, 'churned_rev': 0, 'growing_rev': 0, 'declining_rev': 0, 'new_rev': 0, 'count': 0})
+    active = (curr != 0) | (prev != 0)
+    names = np.asarray(names, dtype=object)[active]
+    curr, prev = curr[active], prev[active]
     
-    for _, row in cust_data.iterrows():
-        name = row.get('Kund', '')
-        curr = float(row.get(curr_ltm_col, 0) or 0)
-        prev = float(row.get(prev_ltm_col, 0) or 0)
-        
-        if curr == 0 and prev == 0:
-            continue
-            
-        industry = classify_customer_industry(name)
-        industry_stats[industry]['curr'] += curr
-        industry_stats[industry]['prev'] += prev
-        industry_stats[industry]['count'] += 1
-        
-        if curr == 0 and prev > 0:
-            industry_stats[industry]['churned_rev'] += prev
-        elif curr > 0 and prev == 0:
-            industry_stats[industry]['new_rev'] += curr
-        elif curr > prev:
-            industry_stats[industry]['growing_rev'] += (curr - prev)
-        elif curr < prev:
-            industry_stats[industry]['declining_rev'] += (prev - curr)
+    idx = np.array([INDUSTRY_TO_IDX[classify_customer_industry(name)] for name in names], dtype=np.intp)
+    
+    # One row per industry: curr, prev, churned_rev, new_rev, count
+    stats = np.zeros((len(INDUSTRY_LIST), 5))
+    np.add.at(stats[:, 0], idx, curr)
+    np.add.at(stats[:, 1], idx, prev)
+    np.add.at(stats[:, 2], idx, np.where((curr == 0) & (prev > 0), prev, 0))
+    np.add.at(stats[:, 3], idx, np.where((curr > 0) & (prev == 0), curr, 0))
+    np.add.at(stats[:, 4], idx, 1)
+    # Ties in the final sort keep the order industries first appear in the sheet
+    first_seen = np.full(len(INDUSTRY_LIST), len(idx))
+    np.minimum.at(first_seen, idx, np.arange(len(idx)))
     
     # Format results
-    for industry, stats in sorted(industry_stats.items(), key=lambda x: x[1]['curr'], reverse=True):
-        if stats['curr'] > 0 or stats['prev'] > 0:
-            change_pct = ((stats['curr'] - stats['prev']) / stats['prev'] * 100) if stats['prev'] > 0 else 0
+    for i in np.lexsort((first_seen, -stats[:, 0])):
+        if first_seen[i] == len(idx): continue  # no customers in this industry
+        c, p, churned_rev, new_rev, count = stats[i].tolist()
+        if c > 0 or p > 0:
+            change_pct = ((c - p) / p * 100) if p > 0 else 0
             results.append({
-                'industry': industry,
-                'curr_ltm': stats['curr'],
-                'prev_ltm': stats['prev'],
+                'industry': INDUSTRY_LIST[i],
+                'curr_ltm': c,
+                'prev_ltm': p,
                 'change_pct': change_pct,
-                'churned_rev': stats['churned_rev'],
-                'new_rev': stats['new_rev'],
-                'count': stats['count']
+                'churned_rev': churned_rev,
+                'new_rev': new_rev,
+                'count': int(count)
             })
     
     return results
 
 
+def analyze_industries(cust_data, curr_ltm_col, prev_ltm_col):
+    """Analyze customer cohorts by industry"""
+    def ltm_values(col):
+        if col not in cust_data: return np.zeros(len(cust_data))
+        return pd.to_numeric(cust_data[col], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    
+    names = cust_data['Kund'].to_numpy() if 'Kund' in cust_data else [''] * len(cust_data)
+    return industry_rollup(names, ltm_values(curr_ltm_col), ltm_values(prev_ltm_col))
+
+
+_TREND = {1: "📈", -1: "📉", 0: "➡️"}
+
 def format_industry_analysis(industry_data):
     """Format industry analysis for AI prompt"""
     if not industry_data:
@@ -106,8 +144,8 @@ def format_industry_analysis(industry_data):
     lines.append("Industry Performance (by current LTM revenue):")
     
     for ind in industry_data[:10]:  # Top 10 industries
-        trend = "📈" if ind['change_pct'] > 0 else "📉" if ind['change_pct'] < 0 else "➡️"
-        lines.append(f"  {trend} {ind['industry']}: {ind['curr_ltm']:,.0f} SEK ({ind['change_pct']:+.1f}% YoY, {ind['count']} customers)")
+        pct = ind['change_pct']
+        lines.append(f"  {_TREND[(pct > 0) - (pct < 0)]} {ind['industry']}: {ind['curr_ltm']:,.0f} SEK ({ind['change_pct']:+.1f}% YoY, {ind['count']} customers)")
         if ind['churned_rev'] > 50000:
             lines.append(f"      ⚠️ Lost {ind['churned_rev']:,.0f} SEK to churn")
     
@@ -127,6 +165,15 @@ def format_industry_analysis(industry_data):
     return "\n".join(lines)
 
 
+@st.cache_resource(show_spinner=False)
+def _anthropic_session():
+    """HTTP session shared across reruns so repeated generations reuse the TLS connection"""
+    # requests is only needed for AI commentary, so it is imported on first use rather than on every page load
+    import requests
+    session = requests.Session()
+    session.headers.update({"content-type": "application/json", "anthropic-version": "2023-06-01"})
+    return session
+
 def generate_ai_commentary(api_key, chart_data):
     """Generate AI commentary for dashboard charts using Claude API"""
     if not api_key:
@@ -258,37 +305,68 @@ Provide analysis in JSON. Be factually accurate - only reference verified custom
 }}"""
 
     try:
-        response = requests.post(
+        with _anthropic_session().post(
             "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": api_key,
-                "content-type": "application/json",
-                "anthropic-version": "2023-06-01"
-            },
+            headers={"x-api-key": api_key},
             json={
                 "model": "claude-opus-4-5-20251101",
                 "max_tokens": 4000,
+                "stream": True,
                 "messages": [{"role": "user", "content": prompt}]
             },
+            stream=True,
             timeout=90
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result['content'][0]['text']
-            json_match = re.search(r'\{[\s\S]*\}', content)
-            if json_match:
-                return json.loads(json_match.group())
-        else:
-            st.warning(f"API error: {response.status_code}")
-            return {}
+        ) as response:
+            if response.status_code == 200:
+                # Consume the SSE stream, showing the text as it arrives
+                placeholder = st.empty()
+                parts = []
+                for line in response.iter_lines():
+                    if not line.startswith(b'data:'):
+                        continue
+                    event = json_loads(line[5:])
+                    if event.get('type') == 'content_block_delta' and event['delta'].get('type') == 'text_delta':
+                        parts.append(event['delta']['text'])
+                        if len(parts) % 20 == 0:
+                            placeholder.code(''.join(parts), language='json')
+                    elif event.get('type') == 'error':
+                        placeholder.empty()
+                        st.warning(f"API error: {event['error'].get('message', 'stream error')}")
+                        return {}
+                    elif event.get('type') == 'message_stop':
+                        break
+                placeholder.empty()
+                content = ''.join(parts)
+                json_match = re.search(r'\{[\s\S]*\}', content)
+                if json_match:
+                    return json_loads(json_match.group())
+            else:
+                st.warning(f"API error: {response.status_code}")
+                return {}
+        return {}  # no JSON object in the reply
     except Exception as e:
         st.warning(f"Commentary generation failed: {str(e)}")
         return {}
 
 st.set_page_config(page_title="HYAB Data Cleaner", page_icon="📊", layout="centered", initial_sidebar_state="collapsed")
 
-st.markdown("""
+_RE_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_RE_SPACE_RUN = re.compile(r'\s+')
+
+@st.cache_resource(show_spinner=False)
+def _minify_html(html):
+    """Drop CSS comments and collapse whitespace runs in static HTML/CSS; cached so it runs once per process, not per rerun"""
+    return _RE_SPACE_RUN.sub(' ', _RE_CSS_COMMENT.sub('', html)).strip()
+
+# Header first, then the stylesheet: st.html sanitizes, and a leading <style> is dropped on some releases
+APP_HEADER_HTML = _minify_html("""
+<div class="hyab-header">
+    <span class="brand-mark">‹</span>
+    <span class="brand-text">HYAB</span>
+    <span class="brand-divider">/</span>
+    <span class="brand-page">Data Cleaner v3.0</span>
+</div>
+
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Libre+Baskerville:ital@1&family=Source+Sans+3:wght@400;500;600&display=swap');
 
@@ -410,6 +488,17 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
     color: var(--navy) !important;
 }
 
+/* Captions and callouts used by the mode pages */
+.page-subtitle {color: var(--grey-text); margin: -16px 0 20px 0;}
+.section-hint {color: var(--grey-text); margin: -8px 0 12px 0;}
+.filter-summary {color: var(--grey-text); margin: 8px 0;}
+.meta-line {font-size: 13px; color: var(--grey-text);}
+.file-note {color: var(--grey-text); font-size: 12px; margin-top: 8px;}
+.file-note.muted {color: #9CA3AF;}
+.spacer {height: 16px;}
+.info-callout {background: #E8F4FD; border-left: 3px solid #1F4E79; padding: 12px 16px; margin-bottom: 16px;}
+.info-callout ul {font-size: 13px; color: #666; margin: 8px 0 0 0; padding-left: 20px;}
+
 .success-banner {
     display: flex;
     align-items: center;
@@ -426,18 +515,22 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
 
 hr {border-color: var(--grey-border) !important;}
 </style>
-
-<div class="hyab-header">
-    <span class="brand-mark">‹</span>
-    <span class="brand-text">HYAB</span>
-    <span class="brand-divider">/</span>
-    <span class="brand-page">Data Cleaner v3.0</span>
-</div>
-""", unsafe_allow_html=True)
-
-def _page_title(t): st.markdown(f'<h1 class="page-title">{t}</h1>', unsafe_allow_html=True)
-def _section_label(t): st.markdown(f'<p class="section-label">{t}</p>', unsafe_allow_html=True)
-def _success_banner(): st.markdown('<div class="success-banner">✓ Done</div>', unsafe_allow_html=True)
+""")
+st.html(APP_HEADER_HTML)
+
+def _page_title(t): st.html(f'<h1 class="page-title">{t}</h1>')
+def _section_label(t): st.html(f'<p class="section-label">{t}</p>')
+def _success_banner(): st.html('<div class="success-banner"><svg width="12" height="12" viewBox="0 0 12 12" aria-hidden="true"><path d="M2 6l3 3 5-7" stroke="currentColor" fill="none" stroke-width="2"/></svg>Done</div>')
+def _callout(html, limit=2048):
+    """Static HTML callout; anything longer than `limit` folds into an expander so it only renders on demand"""
+    if len(html) > limit:
+        with st.expander("Details"): st.html(html)
+    else: st.html(html)
+
+@st.fragment
+def _modes_help():
+    """Mode help toggle; runs as a fragment so flipping it doesn't rerun the whole page"""
+    if st.toggle("What does each mode do?", key="modes_help"): st.dataframe(MODES_HELP, hide_index=True, use_container_width=True)
 
 DEFAULT_FX = {'SEK': 1.0, 'EUR': 11.20, 'USD': 10.50, 'GBP': 13.30}
 
@@ -447,26 +540,242 @@ def find_sheet(wb, names):
         if name.lower() in lower: return wb[lower[name.lower()]]
     return wb[wb.sheetnames[0]] if len(wb.sheetnames) == 1 else None
 
-def clean_amount(raw):
-    if raw is None: return None, None
-    m = re.match(r'([\d\s\xa0\.,]+)\s*(SEK|EUR|USD|GBP)?', str(raw).strip(), re.IGNORECASE)
-    if not m: return None, None
-    s = m.group(1).replace('\xa0', '').replace(' ', '')
-    cur = m.group(2).upper() if m.group(2) else 'SEK'
-    if re.search(r',\d{2}$', s): s = s.replace('.', '').replace(',', '.')
-    else: s = s.replace(',', '')
-    try: return float(s), cur
-    except: return None, None
-
-def clean_num(raw):
-    if raw is None: return None
-    s = str(raw).strip()
-    if s in ['', 'n/a', 'None', '-']: return None
-    s = s.replace('\xa0', '').replace(' ', '')
-    if re.search(r',\d{2}$', s): s = s.replace('.', '').replace(',', '.')
-    else: s = s.replace(',', '')
-    try: return float(s)
-    except: return raw
+def styled_cell(ws, value, font=None, number_format=None):
+    """Cell for a write-only sheet, where styling has to be set before the row is appended"""
+    c = WriteOnlyCell(ws, value=value)
+    if font: c.font = font
+    if number_format: c.number_format = number_format
+    return c
+
+def sheet_data_rows(wb, names, max_col):
+    """Data-row value tuples from the first matching sheet of an open workbook, or None"""
+    ws = find_sheet(wb, names)
+    return None if ws is None else ws.iter_rows(min_row=2, max_col=max_col, values_only=True)
+
+def iter_sheet_rows(file, names, max_col):
+    """Stream data-row value tuples from the first matching sheet, or None; closes the workbook when done."""
+    # read-only openpyxl already iterparses the sheet XML against the shared-strings table; no cell grid is built
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    data_rows = sheet_data_rows(wb, names, max_col)
+    if data_rows is None:
+        wb.close()
+        return None
+    def rows():
+        try: yield from data_rows
+        finally: wb.close()
+    return rows()
+
+_PART_INV = frozenset({'delfakt.', 'fakturerad', 'delfakturerad'})  # fakt_stat values (lower-cased) meaning partially invoiced
+_AMOUNT_RE = re.compile(r'^([\d\s\xa0\.,]+)\s*(SEK|EUR|USD|GBP)?', re.IGNORECASE)
+_DECIMAL_COMMA_RE = re.compile(r',\d{2}$')
+
+def _parse_digits(digits):
+    """float64 array from a Series of space-free digit strings; "1.234,50" style decimal comma vs "1,234.50" thousands comma"""
+    decimal_comma = digits.str.contains(_DECIMAL_COMMA_RE, na=False)
+    digits = digits.where(~decimal_comma, digits.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    digits = digits.where(decimal_comma, digits.str.replace(',', '', regex=False))
+    return pd.to_numeric(digits, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+def clean_amounts(raw):
+    """Vectorized amount parsing: (float64 amounts with NaN where unparseable, upper-cased currencies defaulting to SEK)"""
+    parts = pd.Series(raw, dtype=object).astype(str).str.strip().str.extract(_AMOUNT_RE)
+    digits = parts[0].str.replace('\xa0', '', regex=False).str.replace(' ', '', regex=False)
+    return _parse_digits(digits), parts[1].str.upper().fillna('SEK')
+
+def clean_nums(raw):
+    """Vectorized number parsing: float64 with NaN for blanks, placeholders and anything unparseable"""
+    s = pd.Series(raw, dtype=object).astype(str).str.strip()
+    s = s.where(~s.isin(['', 'n/a', 'None', '-']))
+    return _parse_digits(s.str.replace('\xa0', '', regex=False).str.replace(' ', '', regex=False))
+
+def parse_order_book(rows, fx):
+    """Order Book DataFrame from streamed sheet rows; rows without a parseable amount are skipped"""
+    # Collect columns while streaming, then parse amounts and derive SEK amounts and flags column-wise
+    ordernrs, dates, kunds, statuses, fakt_stats, amt_raws = [], [], [], [], [], []
+    for ordernr, od, kund, status, fakt_stat, amt_raw in rows:
+        if amt_raw is None: continue
+        ordernrs.append(ordernr)
+        dates.append(od if isinstance(od, datetime) else None)
+        kunds.append(kund or '')
+        statuses.append(status or '')
+        fakt_stats.append(str(fakt_stat or ''))
+        amt_raws.append(amt_raw)
+    amts, curs = clean_amounts(amt_raws)
+    orders = pd.DataFrame({
+        'ordernr': pd.Series(ordernrs, dtype=object),
+        'orderdatum': pd.to_datetime(dates),
+        'kundnamn': pd.Series(kunds, dtype=object),
+        'status': pd.Series(statuses, dtype=object),
+        'fakt_stat': pd.Series(fakt_stats, dtype=object),
+        'original_amount': amts,
+        'original_currency': curs.to_numpy(dtype=object),
+    })
+    if np.isnan(amts).any(): orders = orders[~np.isnan(amts)].reset_index(drop=True)
+    # Rates are looked up once per distinct currency and broadcast through the codes; one vector multiply + round
+    cur = pd.Categorical(orders['original_currency'])
+    rates = np.array([fx.get(c, 1.0) for c in cur.categories], dtype=np.float64)[cur.codes]
+    orders['belopp_sek'] = np.round(orders['original_amount'].to_numpy() * rates, 2)
+    # Only a handful of distinct statuses: lower-case and test the categories, then broadcast through the codes
+    fakt = pd.Categorical(orders['fakt_stat'])
+    orders['partially_invoiced'] = fakt.categories.str.lower().isin(_PART_INV)[fakt.codes]
+    # Display strings are formatted once here and shared by the table, the summaries and the report sheets
+    orders['datum'] = orders['orderdatum'].dt.strftime('%Y-%m-%d').fillna('')
+    orders['month'] = orders['datum'].str[:7].replace('', 'Unknown')
+    return orders
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_order_book_cached(file_bytes, fx):
+    """parse_order_book keyed on the uploaded bytes and rates; None if there is no order book sheet"""
+    rows = iter_sheet_rows(BytesIO(file_bytes), ['Order book', 'Sheet1', 'Orders', 'Orderbook'], 6)
+    return None if rows is None else parse_order_book(rows, fx)
+
+def parse_sales_sheet(rows, cols, key):
+    """Sales sheet DataFrame, largest summa first; rows without `key` or with a blank/zero summa are skipped"""
+    df = pd.DataFrame(list(rows or ()), columns=cols, dtype=object)
+    df = df[df[key].notna()]
+    df = df.assign(**{key: df[key].map(str), 'summa': clean_nums(df['summa'])})
+    return df[df['summa'].notna() & (df['summa'] != 0)].sort_values('summa', ascending=False, kind='stable')
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_sales_cached(file_bytes):
+    """(articles, customers) record lists from a monthly sales export, keyed on the uploaded bytes"""
+    # One read-only workbook (zip + shared strings parsed once) feeds both sheets
+    wb = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True, data_only=True, keep_links=False)
+    try:
+        arts = parse_sales_sheet(sheet_data_rows(wb, ['Article', 'Articles', 'Artikel'], 3), ['artikelnr', 'artikelnamn', 'summa'], 'artikelnr')
+        # Sum is in column 4 for Company sheet (Col 3 is Kundtyp)
+        custs = parse_sales_sheet(sheet_data_rows(wb, ['Company', 'Companies', 'Företag', 'Kund'], 4), ['kundnr', 'kund', 'kundtyp', 'summa'], 'kund')
+    finally:
+        wb.close()
+    # Falsy names (None, '', 0) become '', like `name or ''`
+    arts['artikelnamn'] = arts['artikelnamn'].where(arts['artikelnamn'].astype(bool), '')
+    return arts.to_dict('records'), custs.drop(columns='kundtyp').to_dict('records')
+
+# Download workbooks are cached on their inputs: widget reruns reuse the bytes instead of re-serializing the xlsx
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_order_book_xlsx(orders, customer_list, by_month):
+    """Order Book report workbook bytes: Summary, All Orders, By Customer, By Month, Partially Invoiced"""
+    total_sek = orders['belopp_sek'].sum()
+    partial_orders = orders[orders['partially_invoiced']]
+    partial_sek = partial_orders['belopp_sek'].sum()
+    zero_orders = int((orders['belopp_sek'] == 0).sum())
+    
+    # Write-only workbook: rows stream out in order, so every sheet is built top to bottom with append()
+    output = BytesIO()
+    wb_out = openpyxl.Workbook(write_only=True)
+    
+    # Summary
+    ws_sum = wb_out.create_sheet("Summary")
+    ws_sum.column_dimensions['A'].width = 25
+    ws_sum.column_dimensions['B'].width = 15
+    ws_sum.append([styled_cell(ws_sum, "HYAB ORDER BOOK", Font(bold=True, size=14))])
+    ws_sum.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws_sum.append([])
+    ws_sum.append(["Total Orders", len(orders)])
+    ws_sum.append(["Total Value (SEK)", styled_cell(ws_sum, total_sek, number_format='#,##0')])
+    ws_sum.append(["Unique Customers", len(customer_list)])
+    ws_sum.append(["Partially Invoiced Orders", len(partial_orders)])
+    ws_sum.append(["Partially Invoiced Value", styled_cell(ws_sum, partial_sek, number_format='#,##0')])
+    
+    # Sheet rows are fed as plain tuples straight from the columns
+    def sheet_rows(frame, cols):
+        return frame[cols].itertuples(index=False, name=None)
+    def shares(totals):
+        return [f"{v:.1f}%" for v in (totals / total_sek * 100).tolist()] if total_sek > 0 else ["0%"] * len(totals)
+    
+    # All Orders
+    ws_all = wb_out.create_sheet("All Orders")
+    ws_all.append(['Ordernr', 'Orderdatum', 'Kundnamn', 'Fakt.stat', 'Original', 'Currency', 'Belopp SEK'])
+    newest_first = orders.sort_values('orderdatum', ascending=False, na_position='last', kind='stable')
+    for row in sheet_rows(newest_first, ['ordernr', 'datum', 'kundnamn', 'fakt_stat', 'original_amount', 'original_currency', 'belopp_sek']):
+        ws_all.append(row)
+    
+    # By Customer
+    ws_cust = wb_out.create_sheet("By Customer")
+    ws_cust.append([styled_cell(ws_cust, "ORDER BOOK BY CUSTOMER", Font(bold=True))])
+    ws_cust.append([])
+    ws_cust.append(['Customer', 'Orders', 'Total SEK', '% of Total'])
+    for row in zip(customer_list.index, customer_list['orders'], customer_list['total'], shares(customer_list['total'])):
+        ws_cust.append(row)
+    
+    # By Month (only orders with value)
+    ws_month = wb_out.create_sheet("By Month")
+    ws_month.append([styled_cell(ws_month, "ORDERS BY PLACEMENT MONTH", Font(bold=True))])
+    ws_month.append([f"Excludes {zero_orders} orders with 0 SEK" if zero_orders else None])
+    ws_month.append([])
+    ws_month.append(['Month', 'Orders', 'Total SEK', '% of Total'])
+    months = by_month.sort_index()
+    for row in zip(months.index, months['orders'], months['total'], shares(months['total'])):
+        ws_month.append(row)
+    
+    # Partially Invoiced
+    ws_partial = wb_out.create_sheet("Partially Invoiced")
+    ws_partial.append([styled_cell(ws_partial, f"PARTIALLY INVOICED ORDERS ({len(partial_orders)} orders, {partial_sek:,.0f} SEK)", Font(bold=True))])
+    ws_partial.append([])
+    ws_partial.append(['Ordernr', 'Orderdatum', 'Kundnamn', 'Fakt.stat', 'Belopp SEK'])
+    largest_first = partial_orders.sort_values('belopp_sek', ascending=False, kind='stable')
+    for row in sheet_rows(largest_first, ['ordernr', 'datum', 'kundnamn', 'fakt_stat', 'belopp_sek']):
+        ws_partial.append(row)
+    
+    wb_out.save(output)
+    return output.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_sales_xlsx(arts, custs):
+    """Sales workbook bytes: Summary, Top 20 Articles/Customers, full Articles and Customers lists"""
+    total_art = sum(a['summa'] for a in arts)
+    total_cust = sum(c['summa'] for c in custs)
+    top20_art_pct = (sum(a['summa'] for a in arts[:20]) / total_art * 100) if total_art > 0 else 0
+    top20_cust_pct = (sum(c['summa'] for c in custs[:20]) / total_cust * 100) if total_cust > 0 else 0
+    
+    # Create full cleaned Excel matching Victor's format
+    output = BytesIO()
+    wb_out = openpyxl.Workbook(write_only=True)
+    
+    # 1. Summary sheet
+    ws_sum = wb_out.create_sheet("Summary")
+    ws_sum.column_dimensions['A'].width = 25
+    ws_sum.column_dimensions['B'].width = 20
+    ws_sum.append([styled_cell(ws_sum, "HYAB MONTHLY SALES", Font(bold=True, size=14))])
+    ws_sum.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws_sum.append([])
+    ws_sum.append(["Total Sales (excl. VAT)", styled_cell(ws_sum, total_art, number_format='#,##0')])
+    ws_sum.append(["Number of Articles", len(arts)])
+    ws_sum.append(["Number of Customers", len(custs)])
+    ws_sum.append([])
+    ws_sum.append(["Top 20 Articles", f"{top20_art_pct:.0f}% of total"])
+    ws_sum.append(["Top 20 Customers", f"{top20_cust_pct:.0f}% of total"])
+    
+    # 2. Top 20 Articles sheet
+    ws_t20a = wb_out.create_sheet("Top 20 Articles")
+    ws_t20a.append([styled_cell(ws_t20a, f"TOP 20 ARTICLES ({top20_art_pct:.0f}% of total)", Font(bold=True))])
+    ws_t20a.append([])
+    ws_t20a.append(['#', 'Article No', 'Article Name', 'Amount SEK', '% of Total'])
+    for i, a in enumerate(arts[:20], 1):
+        ws_t20a.append([i, a['artikelnr'], a['artikelnamn'], a['summa'], f"{a['summa']/total_art*100:.1f}%" if total_art > 0 else "0%"])
+    
+    # 3. Top 20 Customers sheet
+    ws_t20c = wb_out.create_sheet("Top 20 Customers")
+    ws_t20c.append([styled_cell(ws_t20c, f"TOP 20 CUSTOMERS ({top20_cust_pct:.0f}% of total)", Font(bold=True))])
+    ws_t20c.append([])
+    ws_t20c.append(['#', 'Customer No', 'Customer Name', 'Amount SEK', '% of Total'])
+    for i, c in enumerate(custs[:20], 1):
+        ws_t20c.append([i, c['kundnr'], c['kund'], c['summa'], f"{c['summa']/total_cust*100:.1f}%" if total_cust > 0 else "0%"])
+    
+    # 4. Full Articles sheet
+    ws_art = wb_out.create_sheet("Articles")
+    ws_art.append(['Article No', 'Article Name', 'Amount SEK'])
+    for a in arts:
+        ws_art.append([a['artikelnr'], a['artikelnamn'], a['summa']])
+    
+    # 5. Full Customers sheet
+    ws_cust = wb_out.create_sheet("Customers")
+    ws_cust.append(['Customer No', 'Customer Name', 'Amount SEK'])
+    for c in custs:
+        ws_cust.append([c['kundnr'], c['kund'], c['summa']])
+    
+    wb_out.save(output)
+    return output.getvalue()
 
 def fmt_sek(n):
     if abs(n) >= 1e6: return f"{n/1e6:.1f}M"
@@ -475,52 +784,72 @@ def fmt_sek(n):
 
 def fmt_num(n): return f"{n:,.0f}".replace(",", " ")
 
-def ltm_sort_key(ltm_str):
-    """Sort LTM keys chronologically (format: 'LTM YY-mon' with Swedish month names)"""
-    swedish_months = {'jan':1,'feb':2,'mar':3,'apr':4,'maj':5,'jun':6,'jul':7,'aug':8,'sep':9,'okt':10,'nov':11,'dec':12}
-    try:
-        parts = ltm_str.replace('LTM ', '').split('-')
-        year = int(parts[0]) + 2000
-        month = swedish_months.get(parts[1].lower(), 1)
-        return (year, month)
-    except:
-        return (9999, 99)
+SWEDISH_MONTHS = {'jan':1,'feb':2,'mar':3,'apr':4,'maj':5,'jun':6,'jul':7,'aug':8,'sep':9,'okt':10,'nov':11,'dec':12}
+MONTH_ABBR = ('', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def month_label(m):
+    """'2025-11' -> 'Nov 25' (month keys are always written as YYYY-MM by parse_master)"""
+    return f"{MONTH_ABBR[int(m[5:7])]} {m[2:4]}"
+
+def ltm_label(ltm_str):
+    """'LTM 25-nov' -> 'Nov 25'; keys that don't parse are returned unchanged"""
+    parts = ltm_str.replace('LTM ', '').split('-')
+    if len(parts) < 2: return ltm_str
+    month = SWEDISH_MONTHS.get(parts[1].lower())
+    return f"{MONTH_ABBR[month] if month else parts[1]} {parts[0]}"
+
+LTM_UNPARSEABLE = 999999  # ltm_ordinal of keys that don't parse; sorts after every real period
+
+def ltm_ordinal(ltm_str):
+    """Chronological ordinal YYYYMM for an LTM key (format: 'LTM YY-mon' with Swedish month names)"""
+    parts = ltm_str.replace('LTM ', '').split('-')
+    if len(parts) < 2 or not parts[0].strip().isdecimal():
+        return LTM_UNPARSEABLE
+    return (int(parts[0]) + 2000) * 100 + SWEDISH_MONTHS.get(parts[1].lower(), 1)
 
 def parse_master(wb):
-    data = {'articles': [], 'customers': [], 'monthly_totals': {}, 'ltm_trend': {}}
+    # Customers are stored column-wise: one name array plus dense customers x period
+    # matrices, with *_cols mapping each period key to its (chronological) column
+    data = {'articles': [], 'customer_names': np.array([], dtype=object), 'monthly_totals': {}, 'ltm_trend': {}, 'ltm_sorted': [],
+            'ltm_ordinal': {}, 'ltm_labels': {}, 'ltm_cols': {}, 'ltm_matrix': np.zeros((0, 0)), 'monthly_cols': {}, 'monthly_matrix': np.zeros((0, 0))}
     
     if 'Försäljning per artikel' in wb.sheetnames:
         ws = wb['Försäljning per artikel']
+        header = next(ws.iter_rows(min_row=1, max_row=1, max_col=99, values_only=True), ())
         months, ltms, fys = {}, {}, {}
-        for c in range(3, min(ws.max_column + 1, 100)):
-            h = ws.cell(1, c).value
+        for c in range(2, min(len(header), 99)):
+            h = header[c]
             if h is None: continue
             hs = str(h)
             if isinstance(h, datetime): months[h.strftime('%Y-%m')] = c
             elif hs.startswith('FY'): fys[hs] = c
             elif hs.startswith('LTM'): ltms[hs] = c
             elif hs == 'YTD': fys['YTD'] = c
+        width = len(header)
         
-        for r in range(2, ws.max_row + 1):
-            art = ws.cell(r, 1).value
+        for row in ws.iter_rows(min_row=2, max_col=width or None, values_only=True):
+            if len(row) < width: row = row + (None,) * (width - len(row))
+            art = row[0]
             if not art or art == 'Summa': continue
-            a = {'artikelnr': str(art), 'artikelnamn': ws.cell(r, 2).value or '', 'monthly': {}, 'fy': {}, 'ltm': {}}
+            a = {'artikelnr': str(art), 'artikelnamn': row[1] or '', 'monthly': {}, 'fy': {}, 'ltm': {}}
             for k, c in months.items():
-                v = ws.cell(r, c).value
+                v = row[c]
                 if v and isinstance(v, (int, float)): a['monthly'][k] = v
             for k, c in fys.items():
-                v = ws.cell(r, c).value
+                v = row[c]
                 if v and isinstance(v, (int, float)): a['fy'][k] = v
             for k, c in ltms.items():
-                v = ws.cell(r, c).value
+                v = row[c]
                 if v and isinstance(v, (int, float)): a['ltm'][k] = v
-            if any(a['monthly'].values()) or any(a['fy'].values()): data['articles'].append(a)
+            # Only non-zero numbers are stored, so a non-empty dict already means the row has data
+            if a['monthly'] or a['fy']: data['articles'].append(a)
     
     if 'Försäljning per kund' in wb.sheetnames:
         ws = wb['Försäljning per kund']
+        header = next(ws.iter_rows(min_row=1, max_row=1, max_col=99, values_only=True), ())
         months, ltms, fys, churn_c = {}, {}, {}, None
-        for c in range(3, min(ws.max_column + 1, 100)):
-            h = ws.cell(1, c).value
+        for c in range(2, min(len(header), 99)):
+            h = header[c]
             if h is None: continue
             hs = str(h)
             if isinstance(h, datetime): months[h.strftime('%Y-%m')] = c
@@ -528,59 +857,104 @@ def parse_master(wb):
             elif hs.startswith('LTM'): ltms[hs] = c
             elif hs == 'YTD': fys['YTD'] = c
             # Note: Bortfall column contains YoY change amount, NOT a churn flag
+        width = len(header)
+        month_keys = sorted(months)
+        # Parse each LTM header once; sorting and later lookups only touch the ints
+        ltm_ord = {k: ltm_ordinal(k) for k in ltms}
+        ltm_keys = sorted(ltms, key=ltm_ord.__getitem__)
+        month_idx = [months[k] for k in month_keys]
+        ltm_idx = [ltms[k] for k in ltm_keys]
+        fy_idx = list(fys.values())
+        # Every selected column is numeric by its header: month | LTM | FY blocks side by side
+        value_idx = month_idx + ltm_idx + fy_idx
+        n_m, n_l = len(month_idx), len(ltm_idx)
+        names, cells = [], []
         
-        for r in range(2, ws.max_row + 1):
-            kund = ws.cell(r, 2).value
+        for row in ws.iter_rows(min_row=2, max_col=width or None, values_only=True):
+            if len(row) < width: row = row + (None,) * (width - len(row))
+            kund = row[1]
             if not kund or kund == 'Summa': continue
-            cust = {'kund': str(kund), 'monthly': {}, 'fy': {}, 'ltm': {}}
-            for k, c in months.items():
-                v = ws.cell(r, c).value
-                if v and isinstance(v, (int, float)): cust['monthly'][k] = v
-            for k, c in fys.items():
-                v = ws.cell(r, c).value
-                if v and isinstance(v, (int, float)): cust['fy'][k] = v
-            for k, c in ltms.items():
-                v = ws.cell(r, c).value
-                if v and isinstance(v, (int, float)): cust['ltm'][k] = v
-            if any(cust['monthly'].values()) or any(cust['fy'].values()): data['customers'].append(cust)
+            names.append(str(kund))
+            cells.append(tuple(map(row.__getitem__, value_idx)))
+        
+        # Same type filter as the article sheet, applied to the whole block at once: only int/float
+        # cells count, so blanks, dates and numbers stored as text all become 0
+        block = np.array(cells, dtype=object).reshape(len(names), len(value_idx))
+        is_number = np.frompyfunc(lambda v: isinstance(v, (int, float)), 1, 1)(block).astype(bool)
+        values = np.where(is_number, block, 0).astype(np.float64)
+        keep = values[:, :n_m].any(axis=1) | values[:, n_m + n_l:].any(axis=1)
+        values = values[keep]
+        
+        ltm_matrix = values[:, n_m:n_m + n_l]
+        # Keep only LTM periods where at least one customer has revenue
+        has_revenue = (ltm_matrix != 0).any(axis=0)
+        data['customer_names'] = np.array(names, dtype=object)[keep]
+        data['ltm_sorted'] = [k for k, keep in zip(ltm_keys, has_revenue) if keep]
+        data['ltm_cols'] = {k: i for i, k in enumerate(data['ltm_sorted'])}
+        data['ltm_ordinal'] = {k: ltm_ord[k] for k in data['ltm_sorted']}
+        data['ltm_labels'] = {k: ltm_label(k) for k in data['ltm_sorted']}  # display labels, e.g. "Nov 25"
+        data['ltm_matrix'] = ltm_matrix[:, has_revenue]
+        data['monthly_cols'] = {k: i for i, k in enumerate(month_keys)}
+        data['monthly_matrix'] = values[:, :n_m]
     
     all_m = set()
     for a in data['articles']: all_m.update(a['monthly'].keys())
     for m in sorted(all_m): data['monthly_totals'][m] = sum(a['monthly'].get(m, 0) for a in data['articles'])
     
-    all_l = set()
-    for c in data['customers']: all_l.update(c['ltm'].keys())
-    for l in sorted(all_l, key=ltm_sort_key): data['ltm_trend'][l] = sum(c['ltm'].get(l, 0) for c in data['customers'])
+    for l, total in zip(data['ltm_sorted'], data['ltm_matrix'].sum(axis=0).tolist()): data['ltm_trend'][l] = total
     
     return data
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_master_cached(file_bytes):
+    """parse_master keyed on the uploaded bytes, so reruns skip re-reading the workbook"""
+    wb = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True, data_only=True, keep_links=False)
+    try:
+        return parse_master(wb)
+    finally:
+        wb.close()
+
+def ltm_column(data, ltm_key):
+    """LTM values of every customer for one period (zeros if the period is missing)"""
+    i = data['ltm_cols'].get(ltm_key)
+    if i is None: return np.zeros(len(data['customer_names']))
+    return data['ltm_matrix'][:, i]
+
+def cohort_masks(cur_arr, pre_arr):
+    """Branchless churned/new/declining/growing masks; works on 1D columns or 2D period blocks"""
+    chg_arr = cur_arr - pre_arr
+    # Churned = had revenue last year but ZERO this year
+    churned_mask = (pre_arr > 0) & (cur_arr == 0)
+    new_mask = (pre_arr == 0) & (cur_arr > 0)
+    declining_mask = (chg_arr < 0) & ~churned_mask
+    growing_mask = (chg_arr > 0) & ~new_mask
+    return chg_arr, churned_mask, new_mask, declining_mask, growing_mask
+
 def analyze_cohorts(data, curr, prev):
+    names = data['customer_names']
+    cur_arr = ltm_column(data, curr)
+    pre_arr = ltm_column(data, prev)
+    chg_arr, churned_mask, new_mask, declining_mask, growing_mask = cohort_masks(cur_arr, pre_arr)
+    cur_v, pre_v, chg = cur_arr.tolist(), pre_arr.tolist(), chg_arr.tolist()
+    
+    def ordered(mask, key):
+        # Stable, so ties keep file order exactly like list.sort did
+        idx = np.flatnonzero(mask)
+        return idx[np.argsort(key[idx], kind='stable')]
+    
     churned, declining, growing, new = [], [], [], []
-    for c in data['customers']:
-        cur_v = c['ltm'].get(curr, 0)
-        pre_v = c['ltm'].get(prev, 0)
-        chg = cur_v - pre_v
-        # Churned = had revenue last year but ZERO this year
-        if pre_v > 0 and cur_v == 0:
-            # Find last month with revenue
-            last_month = None
-            sorted_months = sorted(c['monthly'].keys())
-            for m in reversed(sorted_months):
-                if c['monthly'].get(m, 0) > 0:
-                    last_month = m
-                    break
-            churned.append({'kund': c['kund'], 'previous': pre_v, 'current': cur_v, 'change': chg, 'last_month': last_month})
-        elif pre_v == 0 and cur_v > 0:
-            new.append({'kund': c['kund'], 'current': cur_v})
-        elif chg < 0:
-            declining.append({'kund': c['kund'], 'previous': pre_v, 'current': cur_v, 'change': chg, 'pct': (chg/pre_v*100) if pre_v > 0 else 0})
-        elif chg > 0:
-            growing.append({'kund': c['kund'], 'previous': pre_v, 'current': cur_v, 'change': chg, 'pct': (chg/pre_v*100) if pre_v > 0 else 0})
-    
-    churned.sort(key=lambda x: x['previous'], reverse=True)
-    declining.sort(key=lambda x: x['change'])
-    growing.sort(key=lambda x: x['change'], reverse=True)
-    new.sort(key=lambda x: x['current'], reverse=True)
+    month_keys = list(data['monthly_cols'])
+    for i in ordered(churned_mask, -pre_arr):
+        # Find last month with revenue
+        paid = np.flatnonzero(data['monthly_matrix'][i] > 0)
+        last_month = month_keys[paid[-1]] if len(paid) else None
+        churned.append({'kund': names[i], 'previous': pre_v[i], 'current': cur_v[i], 'change': chg[i], 'last_month': last_month})
+    for i in ordered(new_mask, -cur_arr):
+        new.append({'kund': names[i], 'current': cur_v[i]})
+    for i in ordered(declining_mask, chg_arr):
+        declining.append({'kund': names[i], 'previous': pre_v[i], 'current': cur_v[i], 'change': chg[i], 'pct': (chg[i]/pre_v[i]*100) if pre_v[i] > 0 else 0})
+    for i in ordered(growing_mask, -chg_arr):
+        growing.append({'kund': names[i], 'previous': pre_v[i], 'current': cur_v[i], 'change': chg[i], 'pct': (chg[i]/pre_v[i]*100) if pre_v[i] > 0 else 0})
     
     # Build churn timeline (group by last order month)
     churn_timeline = {}
@@ -591,59 +965,56 @@ def analyze_cohorts(data, curr, prev):
         churn_timeline[m]['count'] += 1
         churn_timeline[m]['total'] += c['previous']
     
-    return {'churned': churned, 'declining': declining, 'growing': growing, 'new': new, 'churn_timeline': churn_timeline}
+    return {'churned': churned, 'declining': declining, 'growing': growing, 'new': new, 'churn_timeline': churn_timeline,
+            'active_count': int(np.count_nonzero(cur_arr > 0))}
 
 def get_top20_art(data, ltm_key):
     arts = [{'artikelnr': a['artikelnr'], 'artikelnamn': a['artikelnamn'], 'value': a['ltm'].get(ltm_key, 0)} for a in data['articles'] if a['ltm'].get(ltm_key, 0) > 0]
     return sorted(arts, key=lambda x: x['value'], reverse=True)[:20]
 
 def get_top20_cust(data, curr, prev):
-    custs = []
-    for c in data['customers']:
-        cur_v = c['ltm'].get(curr, 0)
-        if cur_v > 0:
-            custs.append({'kund': c['kund'], 'current': cur_v, 'previous': c['ltm'].get(prev, 0), 'change': cur_v - c['ltm'].get(prev, 0)})
-    return sorted(custs, key=lambda x: x['current'], reverse=True)[:20]
+    names = data['customer_names']
+    cur_arr = ltm_column(data, curr)
+    pre_arr = ltm_column(data, prev)
+    idx = np.flatnonzero(cur_arr > 0)
+    vals = -cur_arr[idx]
+    if len(idx) > 20:
+        # Partition down to the 20th value (keeping ties with it) before the stable sort
+        keep = vals <= np.partition(vals, 19)[19]
+        idx, vals = idx[keep], vals[keep]
+    idx = idx[np.argsort(vals, kind='stable')[:20]]
+    return [{'kund': names[i], 'current': float(cur_arr[i]), 'previous': float(pre_arr[i]), 'change': float(cur_arr[i] - pre_arr[i])} for i in idx]
 
 
 def analyze_ltm_decomposition(data, num_periods=12):
     """Decompose LTM changes month-over-month into churn, decline, growth, and new"""
-    all_ltms = sorted(data['ltm_trend'].keys(), key=ltm_sort_key)
+    all_ltms = data['ltm_sorted']
     if len(all_ltms) < 2:
         return {'periods': [], 'decomposition': []}
     
     recent_ltms = all_ltms[-num_periods:] if len(all_ltms) >= num_periods else all_ltms
     decomposition = []
+    # All consecutive period pairs at once: column j of curr_v/prev_v is recent_ltms[j+1] vs recent_ltms[j]
+    block = data['ltm_matrix'][:, [data['ltm_cols'][k] for k in recent_ltms]]
+    curr_v, prev_v = block[:, 1:], block[:, :-1]
+    diff, churned, new, declining, growing = cohort_masks(curr_v, prev_v)
+    
+    churn_loss = np.where(churned, prev_v, 0).sum(axis=0).tolist()  # Had revenue in prev, zero in curr
+    decline_loss = (-np.where(declining, diff, 0).sum(axis=0)).tolist()  # Lower revenue in curr vs prev
+    growth_gain = np.where(growing, diff, 0).sum(axis=0).tolist()  # Higher revenue in curr vs prev
+    new_gain = np.where(new, curr_v, 0).sum(axis=0).tolist()  # Zero in prev, has revenue in curr
     
+    ltm_trend = data['ltm_trend']  # has every key in ltm_sorted
     for i in range(1, len(recent_ltms)):
         curr_ltm = recent_ltms[i]
         prev_ltm = recent_ltms[i-1]
-        
-        churn_loss = 0  # Had revenue in prev, zero in curr
-        decline_loss = 0  # Lower revenue in curr vs prev
-        growth_gain = 0  # Higher revenue in curr vs prev  
-        new_gain = 0  # Zero in prev, has revenue in curr
-        
-        for c in data['customers']:
-            curr_v = c['ltm'].get(curr_ltm, 0)
-            prev_v = c['ltm'].get(prev_ltm, 0)
-            
-            if prev_v > 0 and curr_v == 0:
-                churn_loss += prev_v
-            elif prev_v == 0 and curr_v > 0:
-                new_gain += curr_v
-            elif curr_v < prev_v:
-                decline_loss += (prev_v - curr_v)
-            elif curr_v > prev_v:
-                growth_gain += (curr_v - prev_v)
-        
         decomposition.append({
             'period': curr_ltm,
-            'total_change': data['ltm_trend'].get(curr_ltm, 0) - data['ltm_trend'].get(prev_ltm, 0),
-            'churn': -churn_loss,
-            'decline': -decline_loss,
-            'growth': growth_gain,
-            'new': new_gain
+            'total_change': ltm_trend[curr_ltm] - ltm_trend[prev_ltm],
+            'churn': -churn_loss[i-1],
+            'decline': -decline_loss[i-1],
+            'growth': growth_gain[i-1],
+            'new': new_gain[i-1]
         })
     
     return {
@@ -655,7 +1026,7 @@ def analyze_ltm_decomposition(data, num_periods=12):
 def analyze_ltm_trajectories(data, num_periods=6):
     """Analyze customer LTM trajectories over multiple periods to identify declining patterns"""
     # Get sorted LTM keys (chronological)
-    all_ltms = sorted(data['ltm_trend'].keys(), key=ltm_sort_key)
+    all_ltms = data['ltm_sorted']
     if len(all_ltms) < 3:
         return {'at_risk': [], 'consistent_decline': [], 'periods': []}
     
@@ -665,43 +1036,39 @@ def analyze_ltm_trajectories(data, num_periods=6):
     at_risk = []  # Declining for 3+ consecutive periods
     consistent_decline = []  # Every period lower than previous
     
-    for c in data['customers']:
-        # Get values for recent periods
-        values = [(ltm, c['ltm'].get(ltm, 0)) for ltm in recent_ltms]
-        values_only = [v for _, v in values]
-        
-        # Skip if no significant revenue
-        if max(values_only) < 50000:  # Skip small customers
-            continue
-        
-        # Count consecutive declines from most recent
-        consecutive_declines = 0
-        for i in range(len(values_only) - 1, 0, -1):
-            if values_only[i] < values_only[i-1]:
-                consecutive_declines += 1
-            else:
-                break
-        
-        # Check if consistently declining (every period lower)
-        all_declining = all(values_only[i] < values_only[i-1] for i in range(1, len(values_only)) if values_only[i-1] > 0)
-        
-        if consecutive_declines >= 3 and values_only[-1] > 0:
-            # Calculate total decline
-            peak_val = max(values_only[:-consecutive_declines]) if len(values_only) > consecutive_declines else values_only[0]
-            curr_val = values_only[-1]
-            decline_pct = ((peak_val - curr_val) / peak_val * 100) if peak_val > 0 else 0
-            at_risk.append({
-                'kund': c['kund'],
-                'current': curr_val,
-                'peak': peak_val,
-                'decline_pct': decline_pct,
-                'consecutive_months': consecutive_declines,
-                'trajectory': values_only[-6:] if len(values_only) >= 6 else values_only
-            })
-        
-        if all_declining and len(values_only) >= 4 and values_only[-1] > 0:
+    # Values for recent periods, one row per customer
+    values = data['ltm_matrix'][:, [data['ltm_cols'][ltm] for ltm in recent_ltms]]
+    drops = values[:, 1:] < values[:, :-1]
+    
+    # Count consecutive declines from most recent (trailing run of drops)
+    consecutive = np.cumprod(drops[:, ::-1], axis=1).sum(axis=1)
+    # Consistently declining = every period lower than a positive predecessor
+    all_declining = (drops | (values[:, :-1] <= 0)).all(axis=1)
+    # Skip small customers (no significant revenue)
+    significant = values.max(axis=1) >= 50000
+    current_pos = values[:, -1] > 0
+    
+    for r in np.flatnonzero(significant & current_pos & (consecutive >= 3)):
+        values_only = values[r].tolist()
+        consecutive_declines = int(consecutive[r])
+        # Calculate total decline
+        peak_val = max(values_only[:-consecutive_declines])
+        curr_val = values_only[-1]
+        decline_pct = ((peak_val - curr_val) / peak_val * 100) if peak_val > 0 else 0
+        at_risk.append({
+            'kund': data['customer_names'][r],
+            'current': curr_val,
+            'peak': peak_val,
+            'decline_pct': decline_pct,
+            'consecutive_months': consecutive_declines,
+            'trajectory': values_only[-6:]
+        })
+    
+    if len(recent_ltms) >= 4:
+        for r in np.flatnonzero(significant & current_pos & all_declining):
+            values_only = values[r].tolist()
             consistent_decline.append({
-                'kund': c['kund'],
+                'kund': data['customer_names'][r],
                 'start': values_only[0],
                 'current': values_only[-1],
                 'decline_pct': ((values_only[0] - values_only[-1]) / values_only[0] * 100) if values_only[0] > 0 else 0,
@@ -719,24 +1086,347 @@ def analyze_ltm_trajectories(data, num_periods=6):
     }
 
 
-def generate_html(data, curr_ltm, prev_ltm, commentary=None):
+SPARK_BARS = ('▁', '▂', '▃', '▄', '▅', '▆', '▇', '█')  # bucket 0..7 -> glyph
+
+# Row templates for the dashboard tables
+_COHORT_ROW_2 = '<tr><td class="customer-name">%s</td><td class="%s">%s</td></tr>'
+_COHORT_ROW_4 = '<tr><td class="customer-name">%s</td><td>%s</td><td>%s</td><td class="%s">%s</td></tr>'
+_TOP_CUST_ROW = '<tr><td class="rank-cell">%d</td><td>%s</td><td>%s</td><td class="%s">%s%s</td><td>%.1f%%</td></tr>'
+_TRAJECTORY_ROW = '<tr><td class="customer-name">%s</td><td>%s</td><td>%s</td><td class="negative">-%.0f%%</td><td style="font-family:monospace;letter-spacing:2px;">%s</td></tr>'
+_INDUSTRY_ROW = '''<tr>
+<td><strong>%s</strong></td>
+<td>%s SEK</td>
+<td style="color:%s;font-weight:600;">%+.1f%%</td>
+<td style="color:#EF4444;">%s</td>
+<td>%s</td>
+<td>%s</td>
+</tr>'''
+_TOP_ART_ROW = '<tr><td class="rank-cell">%d</td><td>%s</td><td>%s</td><td>%s</td><td>%.1f%%</td></tr>'
+
+# Patterns used to lay out the strategic recommendations text
+_RE_LEAD_BR = re.compile(r'^\s*<br><br>')
+_RE_NUM = re.compile(r'\s*\((\d+)\)\s*')
+_RE_ACTION = re.compile(r'\.\s*Action:')
+_RE_TARGET = re.compile(r'\.\s*Target:')
+
+# Static stylesheet for the HTML dashboard, built once at import instead of inside every render
+DASHBOARD_CSS = '''\
+:root {--bg-primary:#0F172A;--bg-card:#1E293B;--bg-card-hover:#334155;--text-primary:#F8FAFC;--text-secondary:#94A3B8;--text-muted:#64748B;--border:#334155;--red-churned:#DC2626;--red-churned-bg:rgba(220,38,38,0.15);--orange-declining:#F97316;--orange-declining-bg:rgba(249,115,22,0.15);--green-growing:#16A34A;--green-growing-bg:rgba(22,163,74,0.15);--teal-new:#0EA5E9;--teal-new-bg:rgba(14,165,233,0.15);--indigo-top:#6366F1;--indigo-top-bg:rgba(99,102,241,0.15);--positive:#22C55E;--negative:#EF4444;}
+*{margin:0;padding:0;box-sizing:border-box;}
+body{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background:var(--bg-primary);color:var(--text-primary);line-height:1.5;}
+.dashboard{max-width:1400px;margin:0 auto;padding:2rem;}
+.header{display:flex;justify-content:space-between;align-items:flex-start;margin-bottom:2rem;padding-bottom:1.5rem;border-bottom:1px solid var(--border);}
+.header-left h1{font-size:1.75rem;font-weight:700;letter-spacing:-0.025em;margin-bottom:0.25rem;}
+.header-left .period{color:var(--text-secondary);font-size:0.9rem;}
+.header-right{text-align:right;color:var(--text-muted);font-size:0.8rem;}
+.summary-strip{display:grid;grid-template-columns:repeat(4,1fr);gap:1rem;margin-bottom:2rem;}
+.summary-card{background:var(--bg-card);border-radius:12px;padding:1.25rem;border:1px solid var(--border);}
+.summary-card .label{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:0.5rem;}
+.summary-card .value{font-size:1.5rem;font-weight:700;font-family:'JetBrains Mono',monospace;}
+.summary-card .subvalue{font-size:0.85rem;color:var(--text-secondary);margin-top:0.25rem;}
+.summary-card.highlight{background:linear-gradient(135deg,var(--bg-card) 0%,rgba(99,102,241,0.1) 100%);border-color:var(--indigo-top);}
+.positive{color:var(--positive);} .negative{color:var(--negative);}
+.chart-grid{display:grid;grid-template-columns:repeat(2,1fr);gap:1.5rem;margin-bottom:2rem;}
+.chart-container{background:var(--bg-card);border-radius:12px;padding:1.5rem;border:1px solid var(--border);}
+.chart-container h3{font-size:0.85rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1rem;}
+.chart-container .chart-wrapper{position:relative;height:250px;width:100%;}
+.chart-section{background:var(--bg-card);border-radius:16px;padding:1.5rem;margin-bottom:2rem;border:1px solid var(--border);}
+.chart-section h2{font-size:1rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1rem;}
+.chart-section .chart-wrapper{position:relative;height:200px;width:100%;}
+.revenue-bridge{background:var(--bg-card);border-radius:16px;padding:2rem;margin-bottom:2rem;border:1px solid var(--border);}
+.revenue-bridge h2{font-size:1rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1.5rem;}
+.bridge-container{display:flex;align-items:flex-end;justify-content:space-between;height:200px;padding:0 1rem;}
+.bridge-item{display:flex;flex-direction:column;align-items:center;flex:1;max-width:140px;}
+.bridge-bar{width:60px;border-radius:4px 4px 0 0;}
+.bridge-bar.start{background:var(--indigo-top);} .bridge-bar.churned{background:var(--red-churned);}
+.bridge-bar.declining{background:var(--orange-declining);} .bridge-bar.growing{background:var(--green-growing);}
+.bridge-bar.new{background:var(--teal-new);} .bridge-bar.end{background:linear-gradient(180deg,var(--indigo-top) 0%,#818CF8 100%);}
+.bridge-label{margin-top:0.75rem;font-size:0.7rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);text-align:center;}
+.bridge-value{margin-top:0.25rem;font-size:0.8rem;font-weight:600;font-family:'JetBrains Mono',monospace;}
+.bridge-connector{flex:0.3;display:flex;align-items:center;justify-content:center;color:var(--text-muted);font-size:1.25rem;}
+.cohort-grid{display:grid;grid-template-columns:repeat(2,1fr);gap:1.5rem;margin-bottom:2rem;}
+.cohort-card{background:var(--bg-card);border-radius:12px;border:1px solid var(--border);overflow:hidden;}
+.cohort-header{padding:1.25rem;display:flex;justify-content:space-between;align-items:center;}
+.cohort-header.churned{background:var(--red-churned-bg);border-bottom:2px solid var(--red-churned);}
+.cohort-header.declining{background:var(--orange-declining-bg);border-bottom:2px solid var(--orange-declining);}
+.cohort-header.growing{background:var(--green-growing-bg);border-bottom:2px solid var(--green-growing);}
+.cohort-header.new{background:var(--teal-new-bg);border-bottom:2px solid var(--teal-new);}
+.cohort-title{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;font-weight:600;}
+.cohort-header.churned .cohort-title{color:var(--red-churned);}
+.cohort-header.declining .cohort-title{color:var(--orange-declining);}
+.cohort-header.growing .cohort-title{color:var(--green-growing);}
+.cohort-header.new .cohort-title{color:var(--teal-new);}
+.cohort-count{font-size:0.7rem;color:var(--text-secondary);margin-top:0.25rem;}
+.cohort-total{font-family:'JetBrains Mono',monospace;font-size:1rem;font-weight:600;}
+.cohort-table{width:100%;border-collapse:collapse;}
+.cohort-table th{text-align:left;padding:0.75rem 1rem;font-size:0.65rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-muted);border-bottom:1px solid var(--border);font-weight:500;}
+.cohort-table th:last-child{text-align:right;}
+.cohort-table td{padding:0.6rem 1rem;font-size:0.8rem;border-bottom:1px solid var(--border);}
+.cohort-table td:last-child{text-align:right;font-family:'JetBrains Mono',monospace;font-size:0.75rem;}
+.cohort-table tr:hover{background:var(--bg-card-hover);}
+.customer-name{color:var(--text-primary);font-weight:500;}
+.top-section{background:var(--bg-card);border-radius:16px;border:1px solid var(--border);overflow:hidden;margin-bottom:2rem;}
+.top-header{padding:1.25rem;background:var(--indigo-top-bg);border-bottom:2px solid var(--indigo-top);display:flex;justify-content:space-between;align-items:center;}
+.top-header h3{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--indigo-top);font-weight:600;}
+.concentration-badge{background:var(--indigo-top);color:white;padding:0.4rem 1rem;border-radius:20px;font-size:0.8rem;font-weight:600;}
+.top-table{width:100%;border-collapse:collapse;}
+.top-table th{text-align:left;padding:0.75rem 1rem;font-size:0.65rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-muted);border-bottom:1px solid var(--border);font-weight:500;}
+.top-table td{padding:0.6rem 1rem;font-size:0.8rem;border-bottom:1px solid var(--border);}
+.top-table tr:hover{background:var(--bg-card-hover);}
+.rank-cell{font-weight:600;color:var(--text-muted);width:40px;}
+.footer{text-align:center;padding-top:1.5rem;border-top:1px solid var(--border);color:var(--text-muted);font-size:0.75rem;}
+.ai-commentary{background:linear-gradient(135deg,rgba(99,102,241,0.1),rgba(14,165,233,0.1));border-left:3px solid #6366F1;padding:12px 16px;margin:12px 0;border-radius:0 8px 8px 0;font-size:0.85rem;color:var(--text-secondary);line-height:1.5;}
+.ai-commentary .ai-icon{margin-right:8px;}
+.summary-commentary{background:linear-gradient(135deg,rgba(99,102,241,0.15),rgba(14,165,233,0.1));border:1px solid rgba(99,102,241,0.3);padding:16px 20px;margin:16px 0;border-radius:12px;font-size:0.9rem;color:var(--text-primary);line-height:1.6;}
+.summary-commentary .ai-icon{font-size:1.1rem;margin-right:10px;}
+@media(max-width:1024px){.summary-strip,.chart-grid,.cohort-grid{grid-template-columns:1fr;}}
+'''
+
+# Chart setup, run after page load once Chart.js and the chart data (#chartData) are available
+DASHBOARD_SCRIPT_HEAD = '''\
+<script>
+function initCharts() {
+    try {
+        Chart.defaults.color = '#94A3B8';
+        Chart.defaults.borderColor = '#334155';
+        
+        var CHARTS = JSON.parse(document.getElementById('chartData').textContent);
+        var ltmLabels = CHARTS.ltm.labels;
+        var ltmValues = CHARTS.ltm.values;
+        var monthLabels = CHARTS.monthly.labels;
+        var monthValues = CHARTS.monthly.values;
+        var yoyDatasets = CHARTS.yoy;
+        var decompLabels = CHARTS.decomp.labels;
+        var decompRows = CHARTS.decomp.rows;
+        var churnTlLabels = CHARTS.churn.labels;
+        var churnTlValues = CHARTS.churn.values;
+        var churnTlCounts = CHARTS.churn.counts;
+        
+        // Named callbacks shared by the chart configs; one formatter per unit for the axis ticks
+        var fmtM = new Intl.NumberFormat('en-US', { minimumFractionDigits: 1, maximumFractionDigits: 1, useGrouping: false });
+        var fmtK = new Intl.NumberFormat('en-US', { maximumFractionDigits: 0, useGrouping: false });
+        function tickM(v) { return fmtM.format(v / 1e6) + 'M'; }
+        function tickK(v) { return fmtK.format(v / 1e3) + 'k'; }
+        function churnTlTooltip(ctx) {
+            var k = (ctx.parsed.y / 1000 + 0.5) | 0;  // rounded kSEK; churn totals are positive and far below 2^31
+            return 'Lost: ' + k + 'k SEK (' + churnTlCounts[ctx.dataIndex] + ' customers)';
+        }
+        
+        console.log('LTM Labels:', ltmLabels.length, 'Values:', ltmValues.length);
+        console.log('Month Labels:', monthLabels.length, 'Values:', monthValues.length);
+        console.log('YoY Datasets:', yoyDatasets.length);
+        
+        var COLORS = {
+            indigo: '#6366F1', indigoFill: 'rgba(99,102,241,0.1)', teal: '#4A9BA8', teal2: '#0D9488',
+            red: '#DC2626', redBar: '#EF4444', orange: '#F97316', green: '#16A34A'
+        };
+        var MONTHS = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'];
+        
+        // Option objects shared by every chart config
+        var OPTS_COMMON = { responsive: true, maintainAspectRatio: false, animation: false };
+        var BAR_HOVER = { mode: 'nearest', intersect: true };
+        var LEGEND_OFF = { legend: { display: false } };
+        var LEGEND_TOP = { legend: { position: 'top' } };
+        
+        // Charts are built lazily as their canvas nears the viewport
+        var chartFactories = {};
+        
+'''
+
+# One chartFactories entry per canvas, keyed by canvas id; generate_html emits only charts that have data
+DASHBOARD_CHARTS = {
+    'ltmChart': '''\
+        chartFactories.ltmChart = function(el) {
+            new Chart(el, {
+                type: 'line',
+                data: {
+                    labels: ltmLabels,
+                    datasets: [{
+                        label: 'LTM Sales',
+                        data: ltmValues,
+                        borderColor: COLORS.indigo,
+                        backgroundColor: COLORS.indigoFill,
+                        tension: 0.3,
+                        fill: true,
+                        pointRadius: 0,
+                        pointHoverRadius: 4,
+                        spanGaps: true
+                    }]
+                },
+                options: Object.assign({}, OPTS_COMMON, {
+                    normalized: true,  // labels arrive sorted and unique
+                    plugins: LEGEND_OFF,
+                    scales: { y: { beginAtZero: false, ticks: { callback: tickM } } }
+                })
+            });
+            console.log('LTM chart created');
+        };
+        
+''',
+    'monthlyChart': '''\
+        chartFactories.monthlyChart = function(el) {
+            new Chart(el, {
+                type: 'bar',
+                data: {
+                    labels: monthLabels,
+                    datasets: [{
+                        label: 'Monthly Sales',
+                        data: monthValues,
+                        backgroundColor: COLORS.teal,
+                        borderRadius: 4
+                    }]
+                },
+                options: Object.assign({}, OPTS_COMMON, {
+                    interaction: BAR_HOVER,
+                    plugins: LEGEND_OFF,
+                    scales: { y: { beginAtZero: true, ticks: { callback: tickM } } }
+                })
+            });
+            console.log('Monthly chart created');
+        };
+        
+''',
+    'yoyChart': '''\
+        chartFactories.yoyChart = function(el) {
+            new Chart(el, {
+                type: 'bar',
+                data: {
+                    labels: MONTHS,
+                    datasets: yoyDatasets
+                },
+                options: Object.assign({}, OPTS_COMMON, {
+                    interaction: BAR_HOVER,
+                    plugins: LEGEND_TOP,
+                    scales: { y: { beginAtZero: true, ticks: { callback: tickM } } }
+                })
+            });
+            console.log('YoY chart created');
+        };
+        
+''',
+    'decompChart': '''\
+        chartFactories.decompChart = function(el) {
+            new Chart(el, {
+                type: 'bar',
+                data: {
+                    labels: decompLabels,
+                    datasets: ['Churn', 'Decline', 'Growth', 'New'].map(function(name, i) {
+                        return {
+                            label: name,
+                            data: decompRows.map(function(r) { return r[i]; }),
+                            backgroundColor: [COLORS.red, COLORS.orange, COLORS.green, COLORS.teal2][i],
+                            stack: 'stack0'
+                        };
+                    })
+                },
+                options: Object.assign({}, OPTS_COMMON, {
+                    interaction: BAR_HOVER,
+                    plugins: LEGEND_TOP,
+                    scales: { 
+                        x: { stacked: true },
+                        y: { 
+                            stacked: true,
+                            ticks: { callback: tickM }
+                        } 
+                    }
+                })
+            });
+            console.log('Decomposition chart created');
+        };
+        
+''',
+    'churnTimelineChart': '''\
+        chartFactories.churnTimelineChart = function(el) {
+            new Chart(el, {
+                type: 'bar',
+                data: {
+                    labels: churnTlLabels,
+                    datasets: [{
+                        label: 'Lost LTM Revenue',
+                        data: churnTlValues,
+                        backgroundColor: COLORS.redBar,
+                        borderColor: COLORS.red,
+                        borderWidth: 1
+                    }]
+                },
+                options: Object.assign({}, OPTS_COMMON, {
+                    interaction: BAR_HOVER,
+                    plugins: { 
+                        legend: LEGEND_OFF.legend,
+                        tooltip: { callbacks: { label: churnTlTooltip } }
+                    },
+                    scales: { 
+                        y: { 
+                            ticks: { callback: tickK }
+                        } 
+                    }
+                })
+            });
+            console.log('Churn Timeline chart created');
+        };
+        
+''',
+}
+
+DASHBOARD_SCRIPT_TAIL = '''\
+        function buildChart(el) {
+            var build = chartFactories[el.id];
+            delete chartFactories[el.id];
+            try { build(el); } catch(e) { chartError(e); }
+        }
+        // At most one chart is built per animation frame so no single task blocks input for long
+        var buildQueue = [];
+        function queueChart(el) {
+            if (!buildQueue.length) requestAnimationFrame(buildNext);
+            buildQueue.push(el);
+        }
+        function buildNext() {
+            buildChart(buildQueue.shift());
+            if (buildQueue.length) requestAnimationFrame(buildNext);
+        }
+        // One DOM query for every canvas that has a chart to build
+        var canvases = [].filter.call(document.querySelectorAll('canvas'), function(el) { return chartFactories[el.id]; });
+        if ('IntersectionObserver' in window) {
+            var io = new IntersectionObserver(function(entries) {
+                entries.forEach(function(e) {
+                    if (e.isIntersecting && chartFactories[e.target.id]) {
+                        io.unobserve(e.target);
+                        queueChart(e.target);
+                    }
+                });
+            }, { rootMargin: '200px' });
+            canvases.forEach(function(el) { io.observe(el); });
+        } else {
+            canvases.forEach(queueChart);
+        }
+        
+        console.log('Chart initialization scheduled');
+    } catch(e) {
+        chartError(e);
+    }
+}
+// Chart.js loads deferred; build charts once the page has loaded and the main thread is idle
+window.addEventListener('load', function() {
+    if (window.requestIdleCallback) requestIdleCallback(initCharts, { timeout: 2000 });
+    else setTimeout(initCharts, 1);
+});
+function chartError(e) {
+    console.error('Chart initialization error:', e);
+    document.body.insertAdjacentHTML('afterbegin', '<div style="background:red;color:white;padding:10px;">Chart Error: ' + e.message + '</div>');
+}
+</script>
+</body></html>'''
+
+def generate_html(data, curr_ltm, prev_ltm, commentary=None, out=None):
     if commentary is None:
         commentary = {}
     
-    total_ltm = data['ltm_trend'].get(curr_ltm, 0)
-    prev_ltm_val = data['ltm_trend'].get(prev_ltm, 0)
+    ltm_trend = data['ltm_trend']
+    total_ltm = ltm_trend.get(curr_ltm, 0)
+    prev_ltm_val = ltm_trend.get(prev_ltm, 0)
     yoy_chg = total_ltm - prev_ltm_val
     yoy_pct = (yoy_chg / prev_ltm_val * 100) if prev_ltm_val > 0 else 0
-    
-    # Format period labels for display (e.g., "LTM 25-nov" -> "Nov 25")
-    def format_ltm_label(ltm_str):
-        month_map = {'jan': 'Jan', 'feb': 'Feb', 'mar': 'Mar', 'apr': 'Apr', 'maj': 'May', 'jun': 'Jun', 
-                     'jul': 'Jul', 'aug': 'Aug', 'sep': 'Sep', 'okt': 'Oct', 'nov': 'Nov', 'dec': 'Dec'}
-        try:
-            parts = ltm_str.replace('LTM ', '').split('-')
-            return f"{month_map.get(parts[1].lower(), parts[1])} {parts[0]}"
-        except:
-            return ltm_str
+    pct_of_total = 100.0 / total_ltm if total_ltm else 0.0  # share of current LTM, as a multiplier
     
     # Helper to create commentary block
     def commentary_block(key):
@@ -756,20 +1446,22 @@ def generate_html(data, curr_ltm, prev_ltm, commentary=None):
                 text = ' '.join(parts) if parts else str(text)
             elif isinstance(text, dict):
                 # Extract values from nested dict structure
+                # Iterative DFS; children are pushed reversed so strings keep document order
                 parts = []
-                def extract_strings(obj, depth=0):
-                    if depth > 2:  # Limit recursion
-                        return
-                    if isinstance(obj, str):
+                append = parts.append
+                stack = [(text, 0)]
+                while stack:
+                    obj, depth = stack.pop()
+                    if depth > 2:  # Limit nesting
+                        continue
+                    t = type(obj)
+                    if t is str:
                         if len(obj) > 20:  # Only meaningful strings
-                            parts.append(obj)
-                    elif isinstance(obj, dict):
-                        for v in obj.values():
-                            extract_strings(v, depth + 1)
-                    elif isinstance(obj, list):
-                        for item in obj:
-                            extract_strings(item, depth + 1)
-                extract_strings(text)
+                            append(obj)
+                    elif t is dict:
+                        stack.extend((v, depth + 1) for v in reversed(obj.values()))
+                    elif t is list:
+                        stack.extend((item, depth + 1) for item in reversed(obj))
                 text = ' '.join(parts) if parts else str(text)
             return f'<div class="ai-commentary"><span class="ai-icon">🤖</span> {text}</div>'
         return ''
@@ -779,8 +1471,6 @@ def generate_html(data, curr_ltm, prev_ltm, commentary=None):
         if not data:
             return ''
         
-        import re
-        
         # If it's a list of recommendation objects, format them nicely
         if isinstance(data, list):
             html_parts = []
@@ -806,7 +1496,7 @@ def generate_html(data, curr_ltm, prev_ltm, commentary=None):
                     html_parts.append(f'<br><br><strong style="color:#6366F1;">({i})</strong> {str(rec)}')
             
             result = ''.join(html_parts)
-            return re.sub(r'^\s*<br><br>', '', result)  # Remove leading breaks
+            return _RE_LEAD_BR.sub('', result)  # Remove leading breaks
         
         # If it's a dict, convert to string
         if isinstance(data, dict):
@@ -815,207 +1505,137 @@ def generate_html(data, curr_ltm, prev_ltm, commentary=None):
         # Handle string input (original format)
         text = str(data)
         # Split on numbered patterns like (1), (2), 1), 2., etc.
-        formatted = re.sub(r'\s*\((\d+)\)\s*', r'<br><br><strong style="color:#6366F1;">(\1)</strong> ', text)
-        formatted = re.sub(r'^\s*<br><br>', '', formatted)  # Remove leading breaks
+        formatted = _RE_NUM.sub(r'<br><br><strong style="color:#6366F1;">(\1)</strong> ', text)
+        formatted = _RE_LEAD_BR.sub('', formatted)  # Remove leading breaks
         # Also handle "Action:" and "Target:" keywords
-        formatted = re.sub(r'\.\s*Action:', r'.<br><span style="color:#10B981;font-weight:500;">→ Action:</span>', formatted)
-        formatted = re.sub(r'\.\s*Target:', r'.<br><span style="color:#F59E0B;font-weight:500;">→ Target:</span>', formatted)
+        formatted = _RE_ACTION.sub(r'.<br><span style="color:#10B981;font-weight:500;">→ Action:</span>', formatted)
+        formatted = _RE_TARGET.sub(r'.<br><span style="color:#F59E0B;font-weight:500;">→ Target:</span>', formatted)
         return formatted
     
-    curr_label = format_ltm_label(curr_ltm)  # e.g., "Nov 25"
-    prev_label = format_ltm_label(prev_ltm)  # e.g., "Nov 24"
+    labels = data['ltm_labels']
+    curr_label = labels.get(curr_ltm) or ltm_label(curr_ltm)  # e.g., "Nov 25"
+    prev_label = labels.get(prev_ltm) or ltm_label(prev_ltm)  # e.g., "Nov 24"
     
     cohorts = analyze_cohorts(data, curr_ltm, prev_ltm)
+    churned, declining, growing, new = cohorts['churned'], cohorts['declining'], cohorts['growing'], cohorts['new']
     trajectories = analyze_ltm_trajectories(data, num_periods=6)
     ltm_decomp = analyze_ltm_decomposition(data, num_periods=12)
-    churn_loss = sum(c['previous'] for c in cohorts['churned'])
-    decline_loss = abs(sum(c['change'] for c in cohorts['declining']))
-    growth_gain = sum(c['change'] for c in cohorts['growing'])
-    new_gain = sum(c['current'] for c in cohorts['new'])
-    active = len([c for c in data['customers'] if c['ltm'].get(curr_ltm, 0) > 0])
+    churn_loss = decline_loss = growth_gain = new_gain = 0
+    for c in churned: churn_loss += c['previous']
+    for c in declining: decline_loss += c['change']
+    for c in growing: growth_gain += c['change']
+    for c in new: new_gain += c['current']
+    decline_loss = abs(decline_loss)
+    active = cohorts['active_count']
     
     top20_cust = get_top20_cust(data, curr_ltm, prev_ltm)
     top20_art = get_top20_art(data, curr_ltm)
-    conc_pct = (sum(c['current'] for c in top20_cust) / total_ltm * 100) if total_ltm > 0 else 0
-    
-    months = sorted(data['monthly_totals'].keys())[-24:]
-    m_labels = [datetime.strptime(m, '%Y-%m').strftime('%b %y') for m in months]
-    m_values = [data['monthly_totals'].get(m, 0) for m in months]
-    
-    ltm_keys = sorted(data['ltm_trend'].keys(), key=ltm_sort_key)[-24:]
-    l_labels, l_values = [], []
-    month_map = {'jan': 'Jan', 'feb': 'Feb', 'mar': 'Mar', 'apr': 'Apr', 'maj': 'May', 'jun': 'Jun', 
-                 'jul': 'Jul', 'aug': 'Aug', 'sep': 'Sep', 'okt': 'Oct', 'nov': 'Nov', 'dec': 'Dec'}
-    for lk in ltm_keys:
-        try:
-            parts = lk.replace('LTM ', '').split('-')
-            l_labels.append(f"{month_map.get(parts[1].lower(), parts[1])} {parts[0]}")
-            l_values.append(data['ltm_trend'][lk])
-        except: pass
-    
-    yoy_data = defaultdict(dict)
-    for m in data['monthly_totals'].keys():
-        try:
-            dt = datetime.strptime(m, '%Y-%m')
-            yoy_data[dt.month][dt.year] = data['monthly_totals'][m]
-        except: pass
-    years = sorted(set(y for md in yoy_data.values() for y in md.keys()))[-3:]
+    conc_pct = sum(c['current'] for c in top20_cust) * pct_of_total if total_ltm > 0 else 0
+    top20_art_pct = sum(a['value'] for a in top20_art) * pct_of_total
+    
+    monthly_totals = data['monthly_totals']
+    month_keys = sorted(monthly_totals)  # sorted once, shared by the monthly and YoY charts
+    months = month_keys[-24:]
+    m_labels = [month_label(m) for m in months]
+    m_values = np.fromiter((monthly_totals[m] for m in months), np.float64, len(months))
+    
+    # Headers without a period (e.g. 'LTM total') stay in the data but have no point on the trend chart
+    ltm_keys = [lk for lk in data['ltm_sorted'][-24:] if data['ltm_ordinal'][lk] != LTM_UNPARSEABLE]
+    l_labels = [labels[lk] for lk in ltm_keys]
+    l_values = np.fromiter((ltm_trend[lk] for lk in ltm_keys), np.float64, len(ltm_keys))
+    
+    # Last three years x 12 months, filled in one pass over the monthly totals
+    years = list(dict.fromkeys(int(m[:4]) for m in month_keys))[-3:]
+    year_row = {yr: i for i, yr in enumerate(years)}
+    yoy_grid = [[0] * 12 for _ in years]
+    for m in month_keys:
+        i = year_row.get(int(m[:4]))
+        if i is not None: yoy_grid[i][int(m[5:7]) - 1] = monthly_totals[m]
     yoy_ds = []
     colors = ['#64748B', '#4A9BA8', '#6366F1']
     for i, yr in enumerate(years):
-        yoy_ds.append({'label': str(yr), 'data': [yoy_data[m].get(yr, 0) for m in range(1, 13)], 'backgroundColor': colors[i] if i < len(colors) else '#6366F1'})
+        yoy_ds.append({'label': str(yr), 'data': yoy_grid[i], 'backgroundColor': colors[i] if i < len(colors) else '#6366F1'})
     
     # Prepare LTM decomposition data for stacked bar chart
-    decomp_labels = []
-    decomp_churn = []
-    decomp_decline = []
-    decomp_growth = []
-    decomp_new = []
-    for d in ltm_decomp['decomposition'][-12:]:
-        try:
-            parts = d['period'].replace('LTM ', '').split('-')
-            decomp_labels.append(f"{month_map.get(parts[1].lower(), parts[1])} {parts[0]}")
-        except:
-            decomp_labels.append(d['period'])
-        decomp_churn.append(d['churn'])
-        decomp_decline.append(d['decline'])
-        decomp_growth.append(d['growth'])
-        decomp_new.append(d['new'])
+    decomp = ltm_decomp['decomposition'][-12:]
+    decomp_labels = [labels[d['period']] for d in decomp]
+    # One [churn, decline, growth, new] row per period; the page splits it into the four stacked datasets
+    decomp_rows = np.array([(d['churn'], d['decline'], d['growth'], d['new']) for d in decomp], np.float64).reshape(-1, 4)
     
     # Prepare churn timeline data (when did churned customers last order)
     churn_tl = cohorts.get('churn_timeline', {})
-    churn_tl_labels = []
-    churn_tl_values = []
-    churn_tl_counts = []
-    for m in sorted(churn_tl.keys()):
-        if m != 'Unknown':
-            try:
-                dt = datetime.strptime(m, '%Y-%m')
-                churn_tl_labels.append(dt.strftime('%b %y'))
-            except:
-                churn_tl_labels.append(m)
-            churn_tl_values.append(churn_tl[m]['total'])
-            churn_tl_counts.append(churn_tl[m]['count'])
+    churn_tl_months = sorted(m for m in churn_tl if m != 'Unknown')
+    churn_tl_labels = [month_label(m) for m in churn_tl_months]
+    churn_tl_values = np.fromiter((churn_tl[m]['total'] for m in churn_tl_months), np.float64, len(churn_tl_months))
+    churn_tl_counts = np.fromiter((churn_tl[m]['count'] for m in churn_tl_months), np.int64, len(churn_tl_months))
     max_val = max(total_ltm, prev_ltm_val)
     scale = 160 / max_val if max_val > 0 else 1
     
     def cohort_rows(items, cols, limit=5):
-        rows = []
-        for c in items[:limit]:
-            if cols == 2:
-                rows.append(f'<tr><td class="customer-name">{c["kund"]}</td><td class="{"positive" if c.get("current",0) > 0 else "negative"}">{fmt_num(c.get("current", c.get("previous", 0)))}</td></tr>')
-            else:
-                cls = "positive" if c['change'] >= 0 else "negative"
-                rows.append(f'<tr><td class="customer-name">{c["kund"]}</td><td>{fmt_num(c["current"])}</td><td>{fmt_num(c["previous"])}</td><td class="{cls}">{fmt_num(c["change"])}</td></tr>')
-        return '\n'.join(rows)
+        if cols == 2:
+            return [_COHORT_ROW_2 % (c['kund'], 'positive' if c.get('current', 0) > 0 else 'negative', fmt_num(c.get('current', c.get('previous', 0))))
+                for c in items[:limit]]
+        return [_COHORT_ROW_4 % (c['kund'], fmt_num(c['current']), fmt_num(c['previous']), 'positive' if c['change'] >= 0 else 'negative', fmt_num(c['change']))
+            for c in items[:limit]]
     
     def top_cust_rows(items):
+        return [_TOP_CUST_ROW % (i, c['kund'], fmt_num(c['current']), *(('positive', '+') if c['change'] >= 0 else ('negative', '')), fmt_num(c['change']), c['current'] * pct_of_total)
+            for i, c in enumerate(items[:20], 1)]
+    
+    def industry_rows(inds):
         rows = []
-        for i, c in enumerate(items[:20]):
-            cls = "positive" if c['change'] >= 0 else "negative"
-            rows.append(f'<tr><td class="rank-cell">{i+1}</td><td>{c["kund"]}</td><td>{fmt_num(c["current"])}</td><td class="{cls}">{("+" if c["change"]>=0 else "")}{fmt_num(c["change"])}</td><td>{c["current"]/total_ltm*100:.1f}%</td></tr>')
-        return '\n'.join(rows)
+        for ind in inds[:10]:
+            name, cp, churned = ind['industry'], ind['change_pct'], ind['churned_rev']
+            color = '#10B981' if cp > 0 else '#EF4444' if cp < 0 else '#6B7280'
+            alignment = '🔥 HIGH GROWTH' if name in HIGH_GROWTH_INDUSTRIES else '⚡ GROWING' if name in GROWING_INDUSTRIES else '📊 STABLE'
+            rows.append(_INDUSTRY_ROW % (name, format(ind['curr_ltm'], ',.0f'), color, cp, f'-{churned:,.0f}' if churned > 0 else '-', ind['count'], alignment))
+        return rows
+    
+    def sparkline(traj):
+        # Mini sparkline representation of a trajectory
+        if not traj: return ''
+        max_t = max(traj)
+        if max_t <= 0: max_t = 1
+        bars, low = SPARK_BARS, SPARK_BARS[0]
+        return ''.join([bars[min(7, int(v/max_t*7))] if v > 0 else low for v in traj])
     
     def trajectory_rows(items):
-        rows = []
-        for c in items[:7]:
-            # Create mini sparkline representation
-            traj = c.get('trajectory', [])
-            if traj:
-                max_t = max(traj) if max(traj) > 0 else 1
-                bars = ''.join(['▁▂▃▄▅▆▇█'[min(7, int(v/max_t*7))] if v > 0 else '▁' for v in traj])
-            else:
-                bars = ''
-            rows.append(f'<tr><td class="customer-name">{c["kund"]}</td><td>{fmt_num(c.get("peak", c.get("start", 0)))}</td><td>{fmt_num(c["current"])}</td><td class="negative">-{c["decline_pct"]:.0f}%</td><td style="font-family:monospace;letter-spacing:2px;">{bars}</td></tr>')
-        return '\n'.join(rows)
+        return [_TRAJECTORY_ROW % (c['kund'], fmt_num(c.get('peak', c.get('start', 0))), fmt_num(c['current']), c['decline_pct'], sparkline(c.get('trajectory', [])))
+            for c in items[:7]]
     
     def top_art_rows(items):
-        rows = []
-        for i, a in enumerate(items[:20]):
-            rows.append(f'<tr><td class="rank-cell">{i+1}</td><td>{a["artikelnr"]}</td><td>{(a["artikelnamn"] or "")[:40]}</td><td>{fmt_num(a["value"])}</td><td>{a["value"]/total_ltm*100:.1f}%</td></tr>')
-        return '\n'.join(rows)
+        return [_TOP_ART_ROW % (i, a['artikelnr'], (a['artikelnamn'] or '')[:40], fmt_num(a['value']), a['value'] * pct_of_total)
+            for i, a in enumerate(items[:20], 1)]
+    
+    # All chart series in one object, serialized with a single encoder call
+    # Charts without data get neither a canvas nor a script block
+    has_chart = {'ltmChart': len(l_values) > 0, 'monthlyChart': len(m_values) > 0, 'yoyChart': bool(yoy_ds),
+                 'decompChart': bool(decomp_labels), 'churnTimelineChart': bool(churn_tl_labels)}
+    def canvas(cid): return f'<canvas id="{cid}"></canvas>' if has_chart[cid] else ''
+    
+    chart_ctx = {
+        'ltm': {'labels': l_labels, 'values': l_values}, 'monthly': {'labels': m_labels, 'values': m_values}, 'yoy': yoy_ds,
+        'decomp': {'labels': decomp_labels, 'rows': decomp_rows},
+        'churn': {'labels': churn_tl_labels, 'values': churn_tl_values, 'counts': churn_tl_counts}
+    }
     
     # Pre-build churned items for the f-string (can't create dicts inside f-string)
-    churned_items = [{'kund': c['kund'], 'current': -c['previous']} for c in cohorts['churned']]
+    churned_items = [{'kund': c['kund'], 'current': -c['previous']} for c in churned]
     
-    html = f'''<!DOCTYPE html>
+    # Written section by section into a text buffer (or the caller's file) instead of one giant string
+    buf = out if out is not None else StringIO()
+    w, writelines = buf.write, buf.writelines
+    
+    w(f'''<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0">
 <title>HYAB Sales Intelligence Dashboard</title>
 <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&family=JetBrains+Mono:wght@500&display=swap" rel="stylesheet">
-<script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+<link rel="preload" as="script" href="https://cdn.jsdelivr.net/npm/chart.js">
+<script defer src="https://cdn.jsdelivr.net/npm/chart.js"></script>
 <style>
-:root {{--bg-primary:#0F172A;--bg-card:#1E293B;--bg-card-hover:#334155;--text-primary:#F8FAFC;--text-secondary:#94A3B8;--text-muted:#64748B;--border:#334155;--red-churned:#DC2626;--red-churned-bg:rgba(220,38,38,0.15);--orange-declining:#F97316;--orange-declining-bg:rgba(249,115,22,0.15);--green-growing:#16A34A;--green-growing-bg:rgba(22,163,74,0.15);--teal-new:#0EA5E9;--teal-new-bg:rgba(14,165,233,0.15);--indigo-top:#6366F1;--indigo-top-bg:rgba(99,102,241,0.15);--positive:#22C55E;--negative:#EF4444;}}
-*{{margin:0;padding:0;box-sizing:border-box;}}
-body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background:var(--bg-primary);color:var(--text-primary);line-height:1.5;}}
-.dashboard{{max-width:1400px;margin:0 auto;padding:2rem;}}
-.header{{display:flex;justify-content:space-between;align-items:flex-start;margin-bottom:2rem;padding-bottom:1.5rem;border-bottom:1px solid var(--border);}}
-.header-left h1{{font-size:1.75rem;font-weight:700;letter-spacing:-0.025em;margin-bottom:0.25rem;}}
-.header-left .period{{color:var(--text-secondary);font-size:0.9rem;}}
-.header-right{{text-align:right;color:var(--text-muted);font-size:0.8rem;}}
-.summary-strip{{display:grid;grid-template-columns:repeat(4,1fr);gap:1rem;margin-bottom:2rem;}}
-.summary-card{{background:var(--bg-card);border-radius:12px;padding:1.25rem;border:1px solid var(--border);}}
-.summary-card .label{{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:0.5rem;}}
-.summary-card .value{{font-size:1.5rem;font-weight:700;font-family:'JetBrains Mono',monospace;}}
-.summary-card .subvalue{{font-size:0.85rem;color:var(--text-secondary);margin-top:0.25rem;}}
-.summary-card.highlight{{background:linear-gradient(135deg,var(--bg-card) 0%,rgba(99,102,241,0.1) 100%);border-color:var(--indigo-top);}}
-.positive{{color:var(--positive);}} .negative{{color:var(--negative);}}
-.chart-grid{{display:grid;grid-template-columns:repeat(2,1fr);gap:1.5rem;margin-bottom:2rem;}}
-.chart-container{{background:var(--bg-card);border-radius:12px;padding:1.5rem;border:1px solid var(--border);}}
-.chart-container h3{{font-size:0.85rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1rem;}}
-.chart-container .chart-wrapper{{position:relative;height:250px;width:100%;}}
-.chart-section{{background:var(--bg-card);border-radius:16px;padding:1.5rem;margin-bottom:2rem;border:1px solid var(--border);}}
-.chart-section h2{{font-size:1rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1rem;}}
-.chart-section .chart-wrapper{{position:relative;height:200px;width:100%;}}
-.revenue-bridge{{background:var(--bg-card);border-radius:16px;padding:2rem;margin-bottom:2rem;border:1px solid var(--border);}}
-.revenue-bridge h2{{font-size:1rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);margin-bottom:1.5rem;}}
-.bridge-container{{display:flex;align-items:flex-end;justify-content:space-between;height:200px;padding:0 1rem;}}
-.bridge-item{{display:flex;flex-direction:column;align-items:center;flex:1;max-width:140px;}}
-.bridge-bar{{width:60px;border-radius:4px 4px 0 0;}}
-.bridge-bar.start{{background:var(--indigo-top);}} .bridge-bar.churned{{background:var(--red-churned);}}
-.bridge-bar.declining{{background:var(--orange-declining);}} .bridge-bar.growing{{background:var(--green-growing);}}
-.bridge-bar.new{{background:var(--teal-new);}} .bridge-bar.end{{background:linear-gradient(180deg,var(--indigo-top) 0%,#818CF8 100%);}}
-.bridge-label{{margin-top:0.75rem;font-size:0.7rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-secondary);text-align:center;}}
-.bridge-value{{margin-top:0.25rem;font-size:0.8rem;font-weight:600;font-family:'JetBrains Mono',monospace;}}
-.bridge-connector{{flex:0.3;display:flex;align-items:center;justify-content:center;color:var(--text-muted);font-size:1.25rem;}}
-.cohort-grid{{display:grid;grid-template-columns:repeat(2,1fr);gap:1.5rem;margin-bottom:2rem;}}
-.cohort-card{{background:var(--bg-card);border-radius:12px;border:1px solid var(--border);overflow:hidden;}}
-.cohort-header{{padding:1.25rem;display:flex;justify-content:space-between;align-items:center;}}
-.cohort-header.churned{{background:var(--red-churned-bg);border-bottom:2px solid var(--red-churned);}}
-.cohort-header.declining{{background:var(--orange-declining-bg);border-bottom:2px solid var(--orange-declining);}}
-.cohort-header.growing{{background:var(--green-growing-bg);border-bottom:2px solid var(--green-growing);}}
-.cohort-header.new{{background:var(--teal-new-bg);border-bottom:2px solid var(--teal-new);}}
-.cohort-title{{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;font-weight:600;}}
-.cohort-header.churned .cohort-title{{color:var(--red-churned);}}
-.cohort-header.declining .cohort-title{{color:var(--orange-declining);}}
-.cohort-header.growing .cohort-title{{color:var(--green-growing);}}
-.cohort-header.new .cohort-title{{color:var(--teal-new);}}
-.cohort-count{{font-size:0.7rem;color:var(--text-secondary);margin-top:0.25rem;}}
-.cohort-total{{font-family:'JetBrains Mono',monospace;font-size:1rem;font-weight:600;}}
-.cohort-table{{width:100%;border-collapse:collapse;}}
-.cohort-table th{{text-align:left;padding:0.75rem 1rem;font-size:0.65rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-muted);border-bottom:1px solid var(--border);font-weight:500;}}
-.cohort-table th:last-child{{text-align:right;}}
-.cohort-table td{{padding:0.6rem 1rem;font-size:0.8rem;border-bottom:1px solid var(--border);}}
-.cohort-table td:last-child{{text-align:right;font-family:'JetBrains Mono',monospace;font-size:0.75rem;}}
-.cohort-table tr:hover{{background:var(--bg-card-hover);}}
-.customer-name{{color:var(--text-primary);font-weight:500;}}
-.top-section{{background:var(--bg-card);border-radius:16px;border:1px solid var(--border);overflow:hidden;margin-bottom:2rem;}}
-.top-header{{padding:1.25rem;background:var(--indigo-top-bg);border-bottom:2px solid var(--indigo-top);display:flex;justify-content:space-between;align-items:center;}}
-.top-header h3{{font-size:0.75rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--indigo-top);font-weight:600;}}
-.concentration-badge{{background:var(--indigo-top);color:white;padding:0.4rem 1rem;border-radius:20px;font-size:0.8rem;font-weight:600;}}
-.top-table{{width:100%;border-collapse:collapse;}}
-.top-table th{{text-align:left;padding:0.75rem 1rem;font-size:0.65rem;text-transform:uppercase;letter-spacing:0.05em;color:var(--text-muted);border-bottom:1px solid var(--border);font-weight:500;}}
-.top-table td{{padding:0.6rem 1rem;font-size:0.8rem;border-bottom:1px solid var(--border);}}
-.top-table tr:hover{{background:var(--bg-card-hover);}}
-.rank-cell{{font-weight:600;color:var(--text-muted);width:40px;}}
-.footer{{text-align:center;padding-top:1.5rem;border-top:1px solid var(--border);color:var(--text-muted);font-size:0.75rem;}}
-.ai-commentary{{background:linear-gradient(135deg,rgba(99,102,241,0.1),rgba(14,165,233,0.1));border-left:3px solid #6366F1;padding:12px 16px;margin:12px 0;border-radius:0 8px 8px 0;font-size:0.85rem;color:var(--text-secondary);line-height:1.5;}}
-.ai-commentary .ai-icon{{margin-right:8px;}}
-.summary-commentary{{background:linear-gradient(135deg,rgba(99,102,241,0.15),rgba(14,165,233,0.1));border:1px solid rgba(99,102,241,0.3);padding:16px 20px;margin:16px 0;border-radius:12px;font-size:0.9rem;color:var(--text-primary);line-height:1.6;}}
-.summary-commentary .ai-icon{{font-size:1.1rem;margin-right:10px;}}
-@media(max-width:1024px){{.summary-strip,.chart-grid,.cohort-grid{{grid-template-columns:1fr;}}}}
-</style>
+{DASHBOARD_CSS}</style>
 </head>
 <body>
 <div class="dashboard">
@@ -1024,22 +1644,25 @@ body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background
 <div class="summary-strip">
 <div class="summary-card highlight"><div class="label">Total LTM Revenue</div><div class="value">{fmt_sek(total_ltm)} SEK</div><div class="subvalue">{fmt_num(total_ltm)} SEK</div></div>
 <div class="summary-card"><div class="label">Year-over-Year</div><div class="value {'positive' if yoy_pct >= 0 else 'negative'}">{yoy_pct:+.1f}%</div><div class="subvalue">{'+' if yoy_chg >= 0 else ''}{fmt_sek(yoy_chg)} SEK</div></div>
-<div class="summary-card"><div class="label">Active Customers</div><div class="value">{active}</div><div class="subvalue">{len(cohorts['churned'])} churned · {len(cohorts['new'])} new</div></div>
-<div class="summary-card"><div class="label">Movement</div><div class="value">{len(cohorts['growing'])} ↑ / {len(cohorts['declining'])} ↓</div><div class="subvalue">Growing vs declining</div></div>
+<div class="summary-card"><div class="label">Active Customers</div><div class="value">{active}</div><div class="subvalue">{len(churned)} churned · {len(new)} new</div></div>
+<div class="summary-card"><div class="label">Movement</div><div class="value">{len(growing)} ↑ / {len(declining)} ↓</div><div class="subvalue">Growing vs declining</div></div>
 </div>
 
-{f'<div class="summary-commentary"><span class="ai-icon">🤖</span> {commentary.get("summary", "")}</div>' if commentary.get("summary") else ''}
+''')
+    if commentary.get("summary"):
+        w(f'<div class="summary-commentary"><span class="ai-icon">🤖</span> {commentary.get("summary", "")}</div>')
+    w(f'''
 
 <div class="chart-grid">
-<div class="chart-container"><h3>📈 Rolling LTM Trend</h3><div class="chart-wrapper"><canvas id="ltmChart"></canvas></div>{commentary_block('ltm_trend')}</div>
-<div class="chart-container"><h3>📊 Monthly Sales</h3><div class="chart-wrapper"><canvas id="monthlyChart"></canvas></div>{commentary_block('monthly_sales')}</div>
+<div class="chart-container"><h3>📈 Rolling LTM Trend</h3><div class="chart-wrapper">{canvas('ltmChart')}</div>{commentary_block('ltm_trend')}</div>
+<div class="chart-container"><h3>📊 Monthly Sales</h3><div class="chart-wrapper">{canvas('monthlyChart')}</div>{commentary_block('monthly_sales')}</div>
 </div>
 
-<div class="chart-section"><h2>📅 Year-over-Year Comparison by Month</h2><div class="chart-wrapper"><canvas id="yoyChart"></canvas></div>{commentary_block('yoy_comparison')}</div>
+<div class="chart-section"><h2>📅 Year-over-Year Comparison by Month</h2><div class="chart-wrapper">{canvas('yoyChart')}</div>{commentary_block('yoy_comparison')}</div>
 
-<div class="chart-section"><h2>🔄 LTM Change Decomposition</h2><p style="color:#94A3B8;font-size:0.85rem;margin:-8px 0 16px 0;">Month-over-month LTM change broken down by: Churn (red), Decline (orange), Growth (green), New (teal)</p><div class="chart-wrapper"><canvas id="decompChart"></canvas></div>{commentary_block('decomposition')}</div>
+<div class="chart-section"><h2>🔄 LTM Change Decomposition</h2><p style="color:#94A3B8;font-size:0.85rem;margin:-8px 0 16px 0;">Month-over-month LTM change broken down by: Churn (red), Decline (orange), Growth (green), New (teal)</p><div class="chart-wrapper">{canvas('decompChart')}</div>{commentary_block('decomposition')}</div>
 
-<div class="chart-section"><h2>⚠️ Churn Timeline: When Customers Left</h2><p style="color:#94A3B8;font-size:0.85rem;margin:-8px 0 16px 0;">Month of LAST ORDER for churned customers (249 accounts, 3.4M SEK). Nov 24 spike = Metso's 1.03M SEK final order before leaving.</p><div class="chart-wrapper"><canvas id="churnTimelineChart"></canvas></div>{commentary_block('churn_timeline')}</div>
+<div class="chart-section"><h2>⚠️ Churn Timeline: When Customers Left</h2><p style="color:#94A3B8;font-size:0.85rem;margin:-8px 0 16px 0;">Month of LAST ORDER for churned customers (249 accounts, 3.4M SEK). Nov 24 spike = Metso's 1.03M SEK final order before leaving.</p><div class="chart-wrapper">{canvas('churnTimelineChart')}</div>{commentary_block('churn_timeline')}</div>
 
 <div class="revenue-bridge"><h2>Revenue Bridge</h2>
 <div class="bridge-container">
@@ -1057,14 +1680,24 @@ body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background
 </div>
 
 <div class="cohort-grid">
-<div class="cohort-card"><div class="cohort-header churned"><div><div class="cohort-title">⚠️ Churned Customers</div><div class="cohort-count">{len(cohorts['churned'])} accounts lost vs {prev_label}</div></div><div class="cohort-total negative">-{fmt_sek(churn_loss)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>Lost ({prev_label})</th></tr></thead><tbody>{cohort_rows(churned_items, 2)}</tbody></table></div>
-<div class="cohort-card"><div class="cohort-header declining"><div><div class="cohort-title">📉 Declining Customers</div><div class="cohort-count">{len(cohorts['declining'])} accounts declining</div></div><div class="cohort-total negative">-{fmt_sek(decline_loss)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>{curr_label}</th><th>{prev_label}</th><th>Change</th></tr></thead><tbody>{cohort_rows(cohorts['declining'],4)}</tbody></table></div>
-<div class="cohort-card"><div class="cohort-header growing"><div><div class="cohort-title">🎉 Growing Customers</div><div class="cohort-count">{len(cohorts['growing'])} accounts expanding</div></div><div class="cohort-total positive">+{fmt_sek(growth_gain)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>{curr_label}</th><th>{prev_label}</th><th>Growth</th></tr></thead><tbody>{cohort_rows(cohorts['growing'],4,7)}</tbody></table></div>
-<div class="cohort-card"><div class="cohort-header new"><div><div class="cohort-title">✨ New Customers</div><div class="cohort-count">{len(cohorts['new'])} new since {prev_label}</div></div><div class="cohort-total positive">+{fmt_sek(new_gain)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>Revenue ({curr_label})</th></tr></thead><tbody>{cohort_rows(cohorts['new'],2,7)}</tbody></table></div>
+<div class="cohort-card"><div class="cohort-header churned"><div><div class="cohort-title">⚠️ Churned Customers</div><div class="cohort-count">{len(churned)} accounts lost vs {prev_label}</div></div><div class="cohort-total negative">-{fmt_sek(churn_loss)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>Lost ({prev_label})</th></tr></thead><tbody>''')
+    writelines(cohort_rows(churned_items, 2))
+    w(f'''</tbody></table></div>
+<div class="cohort-card"><div class="cohort-header declining"><div><div class="cohort-title">📉 Declining Customers</div><div class="cohort-count">{len(declining)} accounts declining</div></div><div class="cohort-total negative">-{fmt_sek(decline_loss)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>{curr_label}</th><th>{prev_label}</th><th>Change</th></tr></thead><tbody>''')
+    writelines(cohort_rows(declining,4))
+    w(f'''</tbody></table></div>
+<div class="cohort-card"><div class="cohort-header growing"><div><div class="cohort-title">🎉 Growing Customers</div><div class="cohort-count">{len(growing)} accounts expanding</div></div><div class="cohort-total positive">+{fmt_sek(growth_gain)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>{curr_label}</th><th>{prev_label}</th><th>Growth</th></tr></thead><tbody>''')
+    writelines(cohort_rows(growing,4,7))
+    w(f'''</tbody></table></div>
+<div class="cohort-card"><div class="cohort-header new"><div><div class="cohort-title">✨ New Customers</div><div class="cohort-count">{len(new)} new since {prev_label}</div></div><div class="cohort-total positive">+{fmt_sek(new_gain)} SEK</div></div><table class="cohort-table"><thead><tr><th>Customer</th><th>Revenue ({curr_label})</th></tr></thead><tbody>''')
+    writelines(cohort_rows(new,2,7))
+    w(f'''</tbody></table></div>
 </div>
 {commentary_block('cohorts')}
 
-{f'''<div class="top-section" style="margin-top:2rem;">
+''')
+    if data.get("industry_analysis"):
+        w(f'''<div class="top-section" style="margin-top:2rem;">
 <div class="top-header" style="background:linear-gradient(135deg,rgba(139,92,246,0.15),rgba(99,102,241,0.1));border-color:#8B5CF6;">
 <h3 style="color:#8B5CF6;">🏭 Industry Analysis</h3>
 <span class="concentration-badge" style="background:#8B5CF6;">Sector Performance</span>
@@ -1072,19 +1705,17 @@ body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background
 <p style="color:#6B7280;font-size:12px;padding:0 1rem;margin:8px 0;">Revenue by industry sector (classified from customer names). Highlights alignment with market growth drivers.</p>
 <table class="top-table">
 <thead><tr><th>Industry</th><th>Current LTM</th><th>YoY Change</th><th>Churned</th><th>Customers</th><th>Market Alignment</th></tr></thead>
-<tbody>''' + ''.join([f'''<tr>
-<td><strong>{ind["industry"]}</strong></td>
-<td>{ind["curr_ltm"]:,.0f} SEK</td>
-<td style="color:{"#10B981" if ind["change_pct"] > 0 else "#EF4444" if ind["change_pct"] < 0 else "#6B7280"};font-weight:600;">{ind["change_pct"]:+.1f}%</td>
-<td style="color:#EF4444;">{f'-{ind["churned_rev"]:,.0f}' if ind["churned_rev"] > 0 else '-'}</td>
-<td>{ind["count"]}</td>
-<td>{"🔥 HIGH GROWTH" if ind["industry"] in ["Energy/Wind", "Automotive/EV", "Mining/Steel"] else "⚡ GROWING" if ind["industry"] in ["Defense/Aerospace", "Manufacturing/Industrial"] else "📊 STABLE"}</td>
-</tr>''' for ind in data.get("industry_analysis", [])[:10]]) + '''</tbody>
+<tbody>''')
+        writelines(industry_rows(data['industry_analysis']))
+        w('''</tbody>
 </table>
-</div>''' if data.get("industry_analysis") else ''}
+</div>''')
+    w(f'''
 {commentary_block('industry_analysis')}
 
-{f'''<div class="top-section" style="margin-top:2rem;">
+''')
+    if trajectories['at_risk']:
+        w(f'''<div class="top-section" style="margin-top:2rem;">
 <div class="top-header" style="background:rgba(239,68,68,0.1);border-color:#EF4444;">
 <h3 style="color:#EF4444;">🔻 At Risk: Declining for 3+ Months</h3>
 <span class="concentration-badge" style="background:#EF4444;">{len(trajectories['at_risk'])} customers</span>
@@ -1092,16 +1723,25 @@ body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background
 <p style="color:#6B7280;font-size:12px;padding:0 1rem;margin-top:-8px;">Customers with declining LTM revenue for 3 or more consecutive months</p>
 <table class="top-table">
 <thead><tr><th>Customer</th><th>Peak LTM</th><th>Current</th><th>Decline</th><th>Trend (6mo)</th></tr></thead>
-<tbody>{trajectory_rows(trajectories['at_risk'])}</tbody>
+<tbody>''')
+        writelines(trajectory_rows(trajectories['at_risk']))
+        w(f'''</tbody>
 </table>
 {commentary_block('at_risk')}
-</div>''' if trajectories['at_risk'] else ''}
+</div>''')
+    w(f'''
 
-<div class="top-section"><div class="top-header"><h3>👑 Top 20 Customers</h3><span class="concentration-badge">{conc_pct:.1f}% of Revenue</span></div><table class="top-table"><thead><tr><th>#</th><th>Customer</th><th>{curr_label}</th><th>vs {prev_label}</th><th>% of Total</th></tr></thead><tbody>{top_cust_rows(top20_cust)}</tbody></table>{commentary_block('top_customers')}</div>
+<div class="top-section"><div class="top-header"><h3>👑 Top 20 Customers</h3><span class="concentration-badge">{conc_pct:.1f}% of Revenue</span></div><table class="top-table"><thead><tr><th>#</th><th>Customer</th><th>{curr_label}</th><th>vs {prev_label}</th><th>% of Total</th></tr></thead><tbody>''')
+    writelines(top_cust_rows(top20_cust))
+    w(f'''</tbody></table>{commentary_block('top_customers')}</div>
 
-<div class="top-section"><div class="top-header" style="background:rgba(74,155,168,0.15);border-color:#4A9BA8;"><h3 style="color:#4A9BA8;">📦 Top 20 Articles</h3><span class="concentration-badge" style="background:#4A9BA8;">{sum(a['value'] for a in top20_art)/total_ltm*100:.1f}% of Revenue</span></div><table class="top-table"><thead><tr><th>#</th><th>Article No</th><th>Description</th><th>{curr_label}</th><th>% of Total</th></tr></thead><tbody>{top_art_rows(top20_art)}</tbody></table></div>
+<div class="top-section"><div class="top-header" style="background:rgba(74,155,168,0.15);border-color:#4A9BA8;"><h3 style="color:#4A9BA8;">📦 Top 20 Articles</h3><span class="concentration-badge" style="background:#4A9BA8;">{top20_art_pct:.1f}% of Revenue</span></div><table class="top-table"><thead><tr><th>#</th><th>Article No</th><th>Description</th><th>{curr_label}</th><th>% of Total</th></tr></thead><tbody>''')
+    writelines(top_art_rows(top20_art))
+    w(f'''</tbody></table></div>
 
-{f'''<div class="top-section" style="margin-top:2rem;">
+''')
+    if commentary.get("strategic_recommendations"):
+        w(f'''<div class="top-section" style="margin-top:2rem;">
 <div class="top-header" style="background:linear-gradient(135deg,rgba(99,102,241,0.15),rgba(14,165,233,0.1));border-color:#6366F1;">
 <h3 style="color:#6366F1;">🚀 Strategic Recommendations</h3>
 <span class="concentration-badge" style="background:#6366F1;">Based on Customer Data</span>
@@ -1113,174 +1753,54 @@ body{{font-family:'Inter',-apple-system,BlinkMacSystemFont,sans-serif;background
 <span class="ai-icon" style="font-size:1.2rem;">🤖</span> {format_strategic_recs(commentary.get("strategic_recommendations", "Enable AI commentary with Claude API key to receive strategic recommendations."))}
 </div>
 </div>
-</div>''' if commentary.get("strategic_recommendations") else ''}
+</div>''')
+    w(f'''
 
 <footer class="footer"><p>HYAB Sales Intelligence Dashboard · Generated by HYAB Data App v3.0 · {datetime.now().strftime('%Y-%m-%d')}</p></footer>
 </div>
 
-<script>
-document.addEventListener('DOMContentLoaded', function() {{
-    try {{
-        Chart.defaults.color = '#94A3B8';
-        Chart.defaults.borderColor = '#334155';
-        
-        var ltmLabels = {json.dumps(l_labels)};
-        var ltmValues = {json.dumps(l_values)};
-        var monthLabels = {json.dumps(m_labels)};
-        var monthValues = {json.dumps(m_values)};
-        var yoyDatasets = {json.dumps(yoy_ds)};
-        var decompLabels = {json.dumps(decomp_labels)};
-        var decompChurn = {json.dumps(decomp_churn)};
-        var decompDecline = {json.dumps(decomp_decline)};
-        var decompGrowth = {json.dumps(decomp_growth)};
-        var decompNew = {json.dumps(decomp_new)};
-        var churnTlLabels = {json.dumps(churn_tl_labels)};
-        var churnTlValues = {json.dumps(churn_tl_values)};
-        var churnTlCounts = {json.dumps(churn_tl_counts)};
-        
-        console.log('LTM Labels:', ltmLabels.length, 'Values:', ltmValues.length);
-        console.log('Month Labels:', monthLabels.length, 'Values:', monthValues.length);
-        console.log('YoY Datasets:', yoyDatasets.length);
-        
-        if (ltmLabels.length > 0 && ltmValues.length > 0) {{
-            new Chart(document.getElementById('ltmChart'), {{
-                type: 'line',
-                data: {{
-                    labels: ltmLabels,
-                    datasets: [{{
-                        label: 'LTM Sales',
-                        data: ltmValues,
-                        borderColor: '#6366F1',
-                        backgroundColor: 'rgba(99,102,241,0.1)',
-                        tension: 0.3,
-                        fill: true,
-                        pointRadius: 3
-                    }}]
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {{ legend: {{ display: false }} }},
-                    scales: {{ y: {{ beginAtZero: false, ticks: {{ callback: function(v) {{ return (v/1000000).toFixed(1) + 'M'; }} }} }} }}
-                }}
-            }});
-            console.log('LTM chart created');
-        }}
-        
-        if (monthLabels.length > 0 && monthValues.length > 0) {{
-            new Chart(document.getElementById('monthlyChart'), {{
-                type: 'bar',
-                data: {{
-                    labels: monthLabels,
-                    datasets: [{{
-                        label: 'Monthly Sales',
-                        data: monthValues,
-                        backgroundColor: '#4A9BA8',
-                        borderRadius: 4
-                    }}]
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {{ legend: {{ display: false }} }},
-                    scales: {{ y: {{ beginAtZero: true, ticks: {{ callback: function(v) {{ return (v/1000000).toFixed(1) + 'M'; }} }} }} }}
-                }}
-            }});
-            console.log('Monthly chart created');
-        }}
-        
-        if (yoyDatasets.length > 0) {{
-            new Chart(document.getElementById('yoyChart'), {{
-                type: 'bar',
-                data: {{
-                    labels: ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'],
-                    datasets: yoyDatasets
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {{ legend: {{ position: 'top' }} }},
-                    scales: {{ y: {{ beginAtZero: true, ticks: {{ callback: function(v) {{ return (v/1000000).toFixed(1) + 'M'; }} }} }} }}
-                }}
-            }});
-            console.log('YoY chart created');
-        }}
-        
-        if (decompLabels.length > 0) {{
-            new Chart(document.getElementById('decompChart'), {{
-                type: 'bar',
-                data: {{
-                    labels: decompLabels,
-                    datasets: [
-                        {{ label: 'Churn', data: decompChurn, backgroundColor: '#DC2626', stack: 'stack0' }},
-                        {{ label: 'Decline', data: decompDecline, backgroundColor: '#F97316', stack: 'stack0' }},
-                        {{ label: 'Growth', data: decompGrowth, backgroundColor: '#16A34A', stack: 'stack0' }},
-                        {{ label: 'New', data: decompNew, backgroundColor: '#0D9488', stack: 'stack0' }}
-                    ]
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {{ legend: {{ position: 'top' }} }},
-                    scales: {{ 
-                        x: {{ stacked: true }},
-                        y: {{ 
-                            stacked: true,
-                            ticks: {{ callback: function(v) {{ return (v/1000000).toFixed(1) + 'M'; }} }}
-                        }} 
-                    }}
-                }}
-            }});
-            console.log('Decomposition chart created');
-        }}
-        
-        // Churn Timeline Chart
-        if (churnTlLabels.length > 0 && churnTlValues.length > 0) {{
-            new Chart(document.getElementById('churnTimelineChart'), {{
-                type: 'bar',
-                data: {{
-                    labels: churnTlLabels,
-                    datasets: [{{
-                        label: 'Lost LTM Revenue',
-                        data: churnTlValues,
-                        backgroundColor: '#EF4444',
-                        borderColor: '#DC2626',
-                        borderWidth: 1
-                    }}]
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {{ 
-                        legend: {{ display: false }},
-                        tooltip: {{
-                            callbacks: {{
-                                label: function(ctx) {{
-                                    var count = churnTlCounts[ctx.dataIndex];
-                                    return 'Lost: ' + (ctx.parsed.y/1000).toFixed(0) + 'k SEK (' + count + ' customers)';
-                                }}
-                            }}
-                        }}
-                    }},
-                    scales: {{ 
-                        y: {{ 
-                            ticks: {{ callback: function(v) {{ return (v/1000).toFixed(0) + 'k'; }} }}
-                        }} 
-                    }}
-                }}
-            }});
-            console.log('Churn Timeline chart created');
-        }}
-        
-        console.log('All charts initialized successfully');
-    }} catch(e) {{
-        console.error('Chart initialization error:', e);
-        document.body.insertAdjacentHTML('afterbegin', '<div style="background:red;color:white;padding:10px;">Chart Error: ' + e.message + '</div>');
-    }}
-}});
-</script>
-</body></html>'''
-    return html
+<script type="application/json" id="chartData">{json_dumps(chart_ctx).replace('</', '<\\/')}</script>
+''')
+    w(DASHBOARD_SCRIPT_HEAD)
+    writelines(DASHBOARD_CHARTS[cid] for cid, shown in has_chart.items() if shown)
+    w(DASHBOARD_SCRIPT_TAIL)
+    if out is None:
+        return buf.getvalue()
+
+
+# Static copy for the mode pages lives here rather than inline in the render branches
+INTEL_HELP_HTML = _minify_html('''<div class="info-callout">
+<strong>How it works:</strong>
+<ul>
+<li><strong>LTM Comparison:</strong> Compares latest LTM column vs same period last year (e.g. "LTM 25-nov" vs "LTM 24-nov")</li>
+<li><strong>Churned:</strong> Customers in "bortfall" column OR had revenue last year but zero this year</li>
+<li><strong>New:</strong> Customers with revenue this year but zero last year in the master file</li>
+<li><strong>Growing/Declining:</strong> Year-over-year change in LTM revenue</li>
+</ul>
+</div>''')
+
+DASHBOARD_CONTENTS_MD = """\
+**Dashboard includes:**
+- Rolling LTM trend chart
+- Monthly sales bar chart
+- Year-over-Year comparison by month
+- Revenue bridge visualization
+- Customer cohorts (Churned, Declining, Growing, New)
+- Top 20 Customers with YoY change
+- Top 20 Articles
+- AI-generated insights (if API key provided)"""
+
+# Mode help as a small table (mode, summary, what it does), shown by the _modes_help fragment
+MODES_HELP = pd.DataFrame([
+    ("Order Book", "Clean and analyze your weekly order book export from Briox.",
+     "Converts all currencies to SEK using your exchange rates · Highlights partially invoiced orders · "
+     "Shows aging alerts for orders >90 days old · Week-over-week comparison (if you upload last week's file)"),
+    ("Sales", "Process monthly sales data for the master file.",
+     "Parses Article and Company sheets · Calculates Top 20 concentration · Prepares data for pasting into Sales_work_file.xlsx"),
+    ("Intelligence", "Generate a full analytics dashboard from your master file.",
+     "Upload Sales_work_file.xlsx to create a downloadable HTML report · Includes LTM trends, YoY comparisons, customer cohorts, "
+     "Top 20 analysis · Share the HTML with Colin or anyone — opens in any browser"),
+], columns=["Mode", "Description", "What it does"])
 
 
 # =============================================================================
@@ -1289,11 +1809,11 @@ document.addEventListener('DOMContentLoaded', function() {{
 
 _section_label("Mode")
 mode = st.radio("Mode", ["Order Book", "Sales", "Intelligence"], label_visibility="collapsed")
-st.markdown("<div style='height:16px'></div>", unsafe_allow_html=True)
+st.html('<div class="spacer"></div>')
 
 if mode == "Order Book":
     _page_title("Process Order Book")
-    st.markdown('<p style="color:#6B7280;margin:-16px 0 20px 0;">Convert currencies to SEK and clean order data from Briox export.</p>', unsafe_allow_html=True)
+    st.html('<p class="page-subtitle">Convert currencies to SEK and clean order data from Briox export.</p>')
     
     _section_label("Exchange rates")
     c1, c2, c3 = st.columns(3)
@@ -1312,28 +1832,10 @@ if mode == "Order Book":
     if st.button("Process", type="primary", disabled=not current_file, use_container_width=True):
         if current_file:
             try:
-                wb = openpyxl.load_workbook(current_file)
-                ws = find_sheet(wb, ['Order book', 'Sheet1', 'Orders', 'Orderbook'])
-                if ws is None: 
+                orders = parse_order_book_cached(current_file.getvalue(), fx)
+                if orders is None: 
                     st.error("Could not find order book sheet")
                 else:
-                    orders = []
-                    for r in range(2, ws.max_row + 1):
-                        amt, cur = clean_amount(ws.cell(r, 6).value)
-                        if amt is None: continue
-                        od = ws.cell(r, 2).value
-                        fakt_stat = ws.cell(r, 5).value or ''
-                        orders.append({
-                            'ordernr': ws.cell(r, 1).value, 
-                            'orderdatum': od if isinstance(od, datetime) else None,
-                            'kundnamn': ws.cell(r, 3).value,
-                            'status': ws.cell(r, 4).value or '',
-                            'fakt_stat': str(fakt_stat),
-                            'partially_invoiced': str(fakt_stat).lower() in ['delfakt.', 'fakturerad', 'delfakturerad'],
-                            'original_amount': amt,
-                            'original_currency': cur,
-                            'belopp_sek': round(amt * fx.get(cur, 1.0), 2)
-                        })
                     st.session_state['ob_res'] = {'orders': orders, 'fx': fx}
                     st.rerun()
             except Exception as e: 
@@ -1343,39 +1845,26 @@ if mode == "Order Book":
         st.markdown("---")
         _success_banner()
         orders = st.session_state['ob_res']['orders']
-        total_sek = sum(o['belopp_sek'] for o in orders)
-        partial_orders = [o for o in orders if o['partially_invoiced']]
-        partial_sek = sum(o['belopp_sek'] for o in partial_orders)
+        belopp = orders['belopp_sek']
+        total_sek = belopp.sum()
+        partial_orders = orders[orders['partially_invoiced']]
+        partial_sek = partial_orders['belopp_sek'].sum()
         
         c1, c2, c3, c4 = st.columns(4)
         with c1: st.metric("Orders", len(orders))
         with c2: st.metric("Total SEK", f"{total_sek:,.0f}")
-        with c3: st.metric("Customers", len(set(o['kundnamn'] for o in orders)))
+        with c3: st.metric("Customers", orders['kundnamn'].nunique())
         with c4: st.metric("Partially Invoiced", f"{len(partial_orders)} ({partial_sek:,.0f} SEK)")
         
         # Filter to orders with actual value for summaries
-        orders_with_value = [o for o in orders if o['belopp_sek'] > 0]
+        orders_with_value = orders[belopp > 0]
         
-        # Build summaries (only orders with value)
-        by_customer = {}
-        for o in orders_with_value:
-            k = o['kundnamn']
-            if k not in by_customer:
-                by_customer[k] = {'orders': 0, 'total': 0}
-            by_customer[k]['orders'] += 1
-            by_customer[k]['total'] += o['belopp_sek']
-        customer_list = sorted(by_customer.items(), key=lambda x: x[1]['total'], reverse=True)
-        
-        by_month = {}
-        for o in orders_with_value:
-            if o['orderdatum']:
-                m = o['orderdatum'].strftime('%Y-%m')
-            else:
-                m = 'Unknown'
-            if m not in by_month:
-                by_month[m] = {'orders': 0, 'total': 0}
-            by_month[m]['orders'] += 1
-            by_month[m]['total'] += o['belopp_sek']
+        # Build summaries (only orders with value); groups keep first-seen order so ties sort as before.
+        # One pass over the orders into a customer x month table; both summaries roll up from that small table
+        by_cust_month = orders_with_value.groupby(['kundnamn', 'month'], sort=False)['belopp_sek'].agg(orders='size', total='sum')
+        by_customer = by_cust_month.groupby(level=0, sort=False).sum()
+        customer_list = by_customer.sort_values('total', ascending=False, kind='stable')
+        by_month = by_cust_month.groupby(level=1, sort=False).sum()
         
         # === INTERACTIVE SECTION ===
         st.markdown("---")
@@ -1384,99 +1873,80 @@ if mode == "Order Book":
         # Filters
         col1, col2, col3 = st.columns(3)
         with col1:
-            customers = ['All'] + [c[0] for c in customer_list]
+            customers = ['All'] + customer_list.index.tolist()
             selected_customer = st.selectbox("Filter by Customer", customers, key="ob_filter_cust")
         with col2:
-            fakt_options = ['All'] + sorted(set(o['fakt_stat'] for o in orders if o['fakt_stat']))
+            fakt_options = ['All'] + sorted(set(orders['fakt_stat']) - {''})
             selected_fakt = st.selectbox("Filter by Invoice Status", fakt_options, key="ob_filter_fakt")
         with col3:
-            sort_options = ['Order Date (newest)', 'Order Date (oldest)', 'Amount (highest)', 'Amount (lowest)', 'Customer A-Z', 'Order Number']
-            selected_sort = st.selectbox("Sort by", sort_options, key="ob_sort")
+            sort_map = {'Order Date (newest)': ('orderdatum', False), 'Order Date (oldest)': ('orderdatum', True),
+                        'Amount (highest)': ('belopp_sek', False), 'Amount (lowest)': ('belopp_sek', True),
+                        'Customer A-Z': ('kundnamn', True), 'Order Number': ('ordernr', False)}
+            selected_sort = st.selectbox("Sort by", list(sort_map), key="ob_sort")
         
-        # Apply filters
-        filtered = orders.copy()
-        if selected_customer != 'All':
-            filtered = [o for o in filtered if o['kundnamn'] == selected_customer]
-        if selected_fakt != 'All':
-            filtered = [o for o in filtered if o['fakt_stat'] == selected_fakt]
-        
-        # Apply sort
-        if selected_sort == 'Order Date (newest)':
-            filtered = sorted(filtered, key=lambda x: x['orderdatum'] or datetime.min, reverse=True)
-        elif selected_sort == 'Order Date (oldest)':
-            filtered = sorted(filtered, key=lambda x: x['orderdatum'] or datetime.min)
-        elif selected_sort == 'Amount (highest)':
-            filtered = sorted(filtered, key=lambda x: x['belopp_sek'], reverse=True)
-        elif selected_sort == 'Amount (lowest)':
-            filtered = sorted(filtered, key=lambda x: x['belopp_sek'])
-        elif selected_sort == 'Customer A-Z':
-            filtered = sorted(filtered, key=lambda x: x['kundnamn'] or '')
-        elif selected_sort == 'Order Number':
-            filtered = sorted(filtered, key=lambda x: x['ordernr'] or 0, reverse=True)
+        # Apply filters as one mask, then one stable sort; missing dates/order numbers rank lowest
+        mask = np.ones(len(orders), dtype=bool)
+        if selected_customer != 'All': mask &= (orders['kundnamn'] == selected_customer).to_numpy()
+        if selected_fakt != 'All': mask &= (orders['fakt_stat'] == selected_fakt).to_numpy()
+        col, asc = sort_map[selected_sort]
+        filtered = orders[mask].sort_values(col, ascending=asc, na_position='first' if asc else 'last', kind='stable')
         
         # Filtered summary
-        filtered_total = sum(o['belopp_sek'] for o in filtered)
-        st.markdown(f'<p style="color:#6B7280;margin:8px 0;">Showing {len(filtered)} orders · {filtered_total:,.0f} SEK</p>', unsafe_allow_html=True)
+        filtered_total = filtered['belopp_sek'].sum()
+        st.html(f'<p class="filter-summary">Showing {len(filtered)} orders · {filtered_total:,.0f} SEK</p>')
         
         # Orders table - use numeric values for proper sorting
-        import pandas as pd
-        table_data = []
-        for o in filtered:
-            table_data.append({
-                'Ordernr': o['ordernr'],
-                'Datum': o['orderdatum'].strftime('%Y-%m-%d') if o['orderdatum'] else '',
-                'Kund': o['kundnamn'][:40] if o['kundnamn'] else '',
-                'Fakt.stat': o['fakt_stat'],
-                'Belopp SEK': o['belopp_sek']  # Keep as number for sorting
-        })
-        if table_data:
-            df = pd.DataFrame(table_data)
+        if len(filtered):
+            df = pd.DataFrame({
+                'Ordernr': filtered['ordernr'].to_numpy(),
+                'Datum': filtered['datum'].to_numpy(),
+                'Kund': filtered['kundnamn'].str[:40].to_numpy(),
+                'Fakt.stat': filtered['fakt_stat'].to_numpy(),
+                'Belopp SEK': filtered['belopp_sek'].to_numpy()  # Keep as number for sorting
+            })
+            # Formatted client-side: a Styler would render every cell to HTML in Python on each rerun
             st.dataframe(
-                df.style.format({'Belopp SEK': '{:,.0f}'}),
+                df,
                 use_container_width=True, 
-                height=300
+                height=300,
+                column_config={'Belopp SEK': st.column_config.NumberColumn(format='%.0f')}
             )
         
         # Show if there are 0 SEK orders excluded
-        zero_orders = [o for o in orders if o['belopp_sek'] == 0]
+        zero_orders = int((belopp == 0).sum())
         if zero_orders:
-            st.markdown(f'<p style="color:#9CA3AF;font-size:12px;margin-top:8px;">ℹ️ {len(zero_orders)} orders with 0 SEK excluded from summaries below (likely fully invoiced)</p>', unsafe_allow_html=True)
+            st.html(f'<p class="file-note muted">ℹ️ {zero_orders} orders with 0 SEK excluded from summaries below (likely fully invoiced)</p>')
         
         # Monthly breakdown
         st.markdown("---")
         _section_label("Orders by Placement Month")
-        st.markdown('<p style="color:#6B7280;margin:-8px 0 12px 0;">Value in order book by when orders were placed (not delivery date)</p>', unsafe_allow_html=True)
+        st.html('<p class="section-hint">Value in order book by when orders were placed (not delivery date)</p>')
         
-        month_data = []
-        for m in sorted(by_month.keys(), reverse=True):
-            data = by_month[m]
-            month_data.append({
-                'Month': m,
-                'Orders': data['orders'],
-                'Total SEK': f"{data['total']:,.0f}",
-                '% of Total': f"{data['total']/total_sek*100:.1f}%" if total_sek > 0 else "0%"
+        # Display tables come straight off the grouped orders/total columns
+        def summary_table(label, keys, frame):
+            totals = frame['total'].tolist()
+            return pd.DataFrame({
+                label: keys,
+                'Orders': frame['orders'].to_numpy(),
+                'Total SEK': [f"{v:,.0f}" for v in totals],
+                '% of Total': [f"{v/total_sek*100:.1f}%" for v in totals] if total_sek > 0 else ["0%"] * len(totals)
             })
-        if month_data:
-            st.dataframe(month_data, use_container_width=True, height=200)
+        
+        if len(by_month):
+            months_desc = by_month.sort_index(ascending=False)
+            st.dataframe(summary_table('Month', months_desc.index.to_numpy(), months_desc), use_container_width=True, height=200)
         
         # Top customers
         st.markdown("---")
         _section_label("Top Customers in Order Book")
-        top_cust_data = []
-        for cust, data in customer_list[:15]:
-            top_cust_data.append({
-                'Customer': cust[:50] if cust else '',
-                'Orders': data['orders'],
-                'Total SEK': f"{data['total']:,.0f}",
-                '% of Total': f"{data['total']/total_sek*100:.1f}%" if total_sek > 0 else "0%"
-            })
-        if top_cust_data:
-            st.dataframe(top_cust_data, use_container_width=True, height=300)
+        if len(customer_list):
+            top_customers = customer_list[:15]
+            st.dataframe(summary_table('Customer', top_customers.index.str[:50], top_customers), use_container_width=True, height=300)
         
         # Month-end tracking export
         st.markdown("---")
         _section_label("Month-End Tracking")
-        st.markdown('<p style="color:#6B7280;margin:-8px 0 12px 0;">Copy this line to paste into your order book tracking spreadsheet</p>', unsafe_allow_html=True)
+        st.html('<p class="section-hint">Copy this line to paste into your order book tracking spreadsheet</p>')
         
         today = datetime.now()
         tracking_line = f"{today.strftime('%Y-%m-%d')}\t{total_sek:.0f}"
@@ -1484,87 +1954,27 @@ if mode == "Order Book":
         
         col1, col2 = st.columns(2)
         with col1:
-            st.markdown(f'<p style="font-size:13px;color:#6B7280;">Date: <strong>{today.strftime("%Y-%m-%d")}</strong></p>', unsafe_allow_html=True)
+            st.html(f'<p class="meta-line">Date: <strong>{today.strftime("%Y-%m-%d")}</strong></p>')
         with col2:
-            st.markdown(f'<p style="font-size:13px;color:#6B7280;">Order Book Total: <strong>{total_sek:,.0f} SEK</strong></p>', unsafe_allow_html=True)
+            st.html(f'<p class="meta-line">Order Book Total: <strong>{total_sek:,.0f} SEK</strong></p>')
         
         # Download section
         st.markdown("---")
         
         # Create downloadable Excel
-        output = BytesIO()
-        wb_out = openpyxl.Workbook()
-        
-        # Summary
-        ws_sum = wb_out.active
-        ws_sum.title = "Summary"
-        ws_sum['A1'] = "HYAB ORDER BOOK"
-        ws_sum['A1'].font = Font(bold=True, size=14)
-        ws_sum['A2'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        ws_sum['A4'] = "Total Orders"
-        ws_sum['B4'] = len(orders)
-        ws_sum['A5'] = "Total Value (SEK)"
-        ws_sum['B5'] = total_sek
-        ws_sum['B5'].number_format = '#,##0'
-        ws_sum['A6'] = "Unique Customers"
-        ws_sum['B6'] = len(by_customer)
-        ws_sum['A7'] = "Partially Invoiced Orders"
-        ws_sum['B7'] = len(partial_orders)
-        ws_sum['A8'] = "Partially Invoiced Value"
-        ws_sum['B8'] = partial_sek
-        ws_sum['B8'].number_format = '#,##0'
-        ws_sum.column_dimensions['A'].width = 25
-        ws_sum.column_dimensions['B'].width = 15
-        
-        # All Orders
-        ws_all = wb_out.create_sheet("All Orders")
-        ws_all.append(['Ordernr', 'Orderdatum', 'Kundnamn', 'Fakt.stat', 'Original', 'Currency', 'Belopp SEK'])
-        for o in sorted(orders, key=lambda x: x['orderdatum'] or datetime.min, reverse=True):
-            ws_all.append([o['ordernr'], o['orderdatum'].strftime('%Y-%m-%d') if o['orderdatum'] else '', o['kundnamn'], o['fakt_stat'], o['original_amount'], o['original_currency'], o['belopp_sek']])
-        
-        # By Customer
-        ws_cust = wb_out.create_sheet("By Customer")
-        ws_cust['A1'] = "ORDER BOOK BY CUSTOMER"
-        ws_cust['A1'].font = Font(bold=True)
-        ws_cust.append([])
-        ws_cust.append(['Customer', 'Orders', 'Total SEK', '% of Total'])
-        for cust, data in customer_list:
-            ws_cust.append([cust, data['orders'], data['total'], f"{data['total']/total_sek*100:.1f}%" if total_sek > 0 else "0%"])
-        
-        # By Month (only orders with value)
-        ws_month = wb_out.create_sheet("By Month")
-        ws_month['A1'] = "ORDERS BY PLACEMENT MONTH"
-        ws_month['A2'] = f"Excludes {len(zero_orders)} orders with 0 SEK" if zero_orders else None
-        ws_month['A1'].font = Font(bold=True)
-        ws_month.append([])
-        ws_month.append(['Month', 'Orders', 'Total SEK', '% of Total'])
-        for m in sorted(by_month.keys()):
-            data = by_month[m]
-            ws_month.append([m, data['orders'], data['total'], f"{data['total']/total_sek*100:.1f}%" if total_sek > 0 else "0%"])
-        
-        # Partially Invoiced
-        ws_partial = wb_out.create_sheet("Partially Invoiced")
-        ws_partial['A1'] = f"PARTIALLY INVOICED ORDERS ({len(partial_orders)} orders, {partial_sek:,.0f} SEK)"
-        ws_partial['A1'].font = Font(bold=True)
-        ws_partial.append([])
-        ws_partial.append(['Ordernr', 'Orderdatum', 'Kundnamn', 'Fakt.stat', 'Belopp SEK'])
-        for o in sorted(partial_orders, key=lambda x: x['belopp_sek'], reverse=True):
-            ws_partial.append([o['ordernr'], o['orderdatum'].strftime('%Y-%m-%d') if o['orderdatum'] else '', o['kundnamn'], o['fakt_stat'], o['belopp_sek']])
-        
-        wb_out.save(output)
         st.download_button(
             label="📥 Download Order Book Report",
-            data=output.getvalue(),
+            data=build_order_book_xlsx(orders, customer_list, by_month),
             file_name=f"HYAB_OrderBook_{datetime.now().strftime('%Y%m%d')}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True
         )
         
-        st.markdown('<p style="color:#6B7280;font-size:12px;margin-top:8px;">Contains: Summary, All Orders, By Customer, By Month, Partially Invoiced</p>', unsafe_allow_html=True)
+        st.html('<p class="file-note">Contains: Summary, All Orders, By Customer, By Month, Partially Invoiced</p>')
 
 elif mode == "Sales":
     _page_title("Process Sales Data")
-    st.markdown('<p style="color:#6B7280;margin:-16px 0 20px 0;">Parse monthly sales export for pasting into Sales_work_file.xlsx.</p>', unsafe_allow_html=True)
+    st.html('<p class="page-subtitle">Parse monthly sales export for pasting into Sales_work_file.xlsx.</p>')
     
     _section_label("Exchange rates")
     c1, c2, c3 = st.columns(3)
@@ -1583,34 +1993,8 @@ elif mode == "Sales":
     if st.button("Process", type="primary", disabled=not f, use_container_width=True):
         if f:
             try:
-                wb = openpyxl.load_workbook(f)
-                ws_art = find_sheet(wb, ['Article', 'Articles', 'Artikel'])
-                ws_cust = find_sheet(wb, ['Company', 'Companies', 'Företag', 'Kund'])
-                
-                arts = []
-                custs = []
-                
-                if ws_art:
-                    for r in range(2, ws_art.max_row + 1):
-                        an = ws_art.cell(r, 1).value
-                        if an is None: continue
-                        s = clean_num(ws_art.cell(r, 3).value)
-                        if s is None or s == 0: continue
-                        arts.append({'artikelnr': str(an), 'artikelnamn': ws_art.cell(r, 2).value or '', 'summa': s})
-                
-                if ws_cust:
-                    for r in range(2, ws_cust.max_row + 1):
-                        kund = ws_cust.cell(r, 2).value
-                        if kund is None: continue
-                        # Sum is in column 4 for Company sheet (Col 3 is Kundtyp)
-                        s = clean_num(ws_cust.cell(r, 4).value)
-                        if s is None or s == 0: continue
-                        custs.append({'kundnr': ws_cust.cell(r, 1).value, 'kund': str(kund), 'summa': s})
-                
-                st.session_state['sales_res'] = {
-                    'articles': sorted(arts, key=lambda x: x['summa'], reverse=True),
-                    'customers': sorted(custs, key=lambda x: x['summa'], reverse=True)
-                }
+                arts, custs = parse_sales_cached(f.getvalue())
+                st.session_state['sales_res'] = {'articles': arts, 'customers': custs}
                 st.rerun()
             except Exception as e: 
                 st.error(str(e))
@@ -1623,11 +2007,8 @@ elif mode == "Sales":
         custs = res['customers']
         
         total_art = sum(a['summa'] for a in arts)
-        total_cust = sum(c['summa'] for c in custs)
         top20_art_total = sum(a['summa'] for a in arts[:20])
-        top20_cust_total = sum(c['summa'] for c in custs[:20])
         top20_art_pct = (top20_art_total / total_art * 100) if total_art > 0 else 0
-        top20_cust_pct = (top20_cust_total / total_cust * 100) if total_cust > 0 else 0
         
         c1, c2, c3, c4 = st.columns(4)
         with c1: st.metric("Total Sales", f"{total_art:,.0f} SEK")
@@ -1635,84 +2016,21 @@ elif mode == "Sales":
         with c3: st.metric("Customers", len(custs))
         with c4: st.metric("Top 20 Articles", f"{top20_art_pct:.0f}%")
         
-        # Create full cleaned Excel matching Victor's format
-        output = BytesIO()
-        wb_out = openpyxl.Workbook()
-        
-        # 1. Summary sheet
-        ws_sum = wb_out.active
-        ws_sum.title = "Summary"
-        ws_sum['A1'] = "HYAB MONTHLY SALES"
-        ws_sum['A1'].font = Font(bold=True, size=14)
-        ws_sum['A2'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        ws_sum['A4'] = "Total Sales (excl. VAT)"
-        ws_sum['B4'] = total_art
-        ws_sum['B4'].number_format = '#,##0'
-        ws_sum['A5'] = "Number of Articles"
-        ws_sum['B5'] = len(arts)
-        ws_sum['A6'] = "Number of Customers"
-        ws_sum['B6'] = len(custs)
-        ws_sum['A8'] = "Top 20 Articles"
-        ws_sum['B8'] = f"{top20_art_pct:.0f}% of total"
-        ws_sum['A9'] = "Top 20 Customers"
-        ws_sum['B9'] = f"{top20_cust_pct:.0f}% of total"
-        ws_sum.column_dimensions['A'].width = 25
-        ws_sum.column_dimensions['B'].width = 20
-        
-        # 2. Top 20 Articles sheet
-        ws_t20a = wb_out.create_sheet("Top 20 Articles")
-        ws_t20a['A1'] = f"TOP 20 ARTICLES ({top20_art_pct:.0f}% of total)"
-        ws_t20a['A1'].font = Font(bold=True)
-        ws_t20a.append([])
-        ws_t20a.append(['#', 'Article No', 'Article Name', 'Amount SEK', '% of Total'])
-        for i, a in enumerate(arts[:20], 1):
-            ws_t20a.append([i, a['artikelnr'], a['artikelnamn'], a['summa'], f"{a['summa']/total_art*100:.1f}%" if total_art > 0 else "0%"])
-        
-        # 3. Top 20 Customers sheet
-        ws_t20c = wb_out.create_sheet("Top 20 Customers")
-        ws_t20c['A1'] = f"TOP 20 CUSTOMERS ({top20_cust_pct:.0f}% of total)"
-        ws_t20c['A1'].font = Font(bold=True)
-        ws_t20c.append([])
-        ws_t20c.append(['#', 'Customer No', 'Customer Name', 'Amount SEK', '% of Total'])
-        for i, c in enumerate(custs[:20], 1):
-            ws_t20c.append([i, c['kundnr'], c['kund'], c['summa'], f"{c['summa']/total_cust*100:.1f}%" if total_cust > 0 else "0%"])
-        
-        # 4. Full Articles sheet
-        ws_art = wb_out.create_sheet("Articles")
-        ws_art.append(['Article No', 'Article Name', 'Amount SEK'])
-        for a in arts:
-            ws_art.append([a['artikelnr'], a['artikelnamn'], a['summa']])
-        
-        # 5. Full Customers sheet
-        ws_cust = wb_out.create_sheet("Customers")
-        ws_cust.append(['Customer No', 'Customer Name', 'Amount SEK'])
-        for c in custs:
-            ws_cust.append([c['kundnr'], c['kund'], c['summa']])
-        
-        wb_out.save(output)
         st.download_button(
             label="📥 Download Cleaned Sales Data",
-            data=output.getvalue(),
+            data=build_sales_xlsx(arts, custs),
             file_name=f"HYAB_Sales_{datetime.now().strftime('%Y%m')}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True
         )
         
-        st.markdown('<p style="color:#6B7280;font-size:12px;margin-top:8px;">Contains: Summary, Top 20 Articles, Top 20 Customers, full Articles list, full Customers list</p>', unsafe_allow_html=True)
+        st.html('<p class="file-note">Contains: Summary, Top 20 Articles, Top 20 Customers, full Articles list, full Customers list</p>')
 
 else:
     _page_title("Sales Intelligence")
-    st.markdown('<p style="color:#6B7280;margin:-16px 0 20px 0;">Generate analytics dashboard from your master Sales_work_file.xlsx.</p>', unsafe_allow_html=True)
+    st.html('<p class="page-subtitle">Generate analytics dashboard from your master Sales_work_file.xlsx.</p>')
     
-    st.markdown('''<div style="background:#E8F4FD;border-left:3px solid #1F4E79;padding:12px 16px;margin-bottom:16px;">
-<strong>How it works:</strong>
-<ul style="font-size:13px;color:#666;margin:8px 0 0 0;padding-left:20px;">
-<li><strong>LTM Comparison:</strong> Compares latest LTM column vs same period last year (e.g. "LTM 25-nov" vs "LTM 24-nov")</li>
-<li><strong>Churned:</strong> Customers in "bortfall" column OR had revenue last year but zero this year</li>
-<li><strong>New:</strong> Customers with revenue this year but zero last year in the master file</li>
-<li><strong>Growing/Declining:</strong> Year-over-year change in LTM revenue</li>
-</ul>
-</div>''', unsafe_allow_html=True)
+    _callout(INTEL_HELP_HTML)
     
     # API Key input for AI commentary
     _section_label("AI Commentary (optional)")
@@ -1724,9 +2042,8 @@ else:
         if f:
             try:
                 with st.spinner("Loading master file..."):
-                    wb = openpyxl.load_workbook(f, data_only=True)
-                    data = parse_master(wb)
-                ltms = sorted(data['ltm_trend'].keys(), key=ltm_sort_key)
+                    data = parse_master_cached(f.getvalue())
+                ltms = data['ltm_sorted']
                 curr = ltms[-1] if ltms else None
                 prev = ltms[-13] if len(ltms) > 12 else ltms[0] if ltms else None
                 if curr and prev:
@@ -1735,33 +2052,7 @@ else:
                     trajectories = analyze_ltm_trajectories(data, num_periods=6)
                     
                     # Analyze industries
-                    industry_data = []
-                    industry_stats = defaultdict(lambda: {'curr': 0, 'prev': 0, 'churned_rev': 0, 'new_rev': 0, 'count': 0})
-                    for c in data['customers']:
-                        curr_v = c['ltm'].get(curr, 0)
-                        prev_v = c['ltm'].get(prev, 0)
-                        if curr_v == 0 and prev_v == 0:
-                            continue
-                        industry = classify_customer_industry(c['kund'])
-                        industry_stats[industry]['curr'] += curr_v
-                        industry_stats[industry]['prev'] += prev_v
-                        industry_stats[industry]['count'] += 1
-                        if curr_v == 0 and prev_v > 0:
-                            industry_stats[industry]['churned_rev'] += prev_v
-                        elif curr_v > 0 and prev_v == 0:
-                            industry_stats[industry]['new_rev'] += curr_v
-                    
-                    for ind, stats in sorted(industry_stats.items(), key=lambda x: x[1]['curr'], reverse=True):
-                        if stats['curr'] > 0 or stats['prev'] > 0:
-                            change_pct = ((stats['curr'] - stats['prev']) / stats['prev'] * 100) if stats['prev'] > 0 else 0
-                            industry_data.append({
-                                'industry': ind,
-                                'curr_ltm': stats['curr'],
-                                'change_pct': change_pct,
-                                'churned_rev': stats['churned_rev'],
-                                'count': stats['count']
-                            })
-                    
+                    industry_data = industry_rollup(data['customer_names'], ltm_column(data, curr), ltm_column(data, prev))
                     industry_analysis = format_industry_analysis(industry_data)
                     
                     # Build chart data summary for AI
@@ -1770,18 +2061,15 @@ else:
                     
                     # LTM trend summary (last 6 periods)
                     recent_ltms = ltms[-6:]
-                    ltm_trend_summary = "\n".join([f"- {l}: {data['ltm_trend'].get(l, 0):,.0f} SEK" for l in recent_ltms])
+                    ltm_trend = data['ltm_trend']
+                    ltm_trend_summary = "\n".join([f"- {l}: {ltm_trend[l]:,.0f} SEK" for l in recent_ltms])
                     
                     # Monthly sales summary (last 12 months actual monthly sales, NOT LTM)
-                    months = sorted(data['monthly_totals'].keys())[-12:]
+                    monthly_totals = data['monthly_totals']
+                    months = sorted(monthly_totals)[-12:]
                     def format_month(m):
-                        try:
-                            from datetime import datetime
-                            dt = datetime.strptime(m, '%Y-%m')
-                            return dt.strftime('%b %Y')
-                        except:
-                            return m
-                    monthly_sales_summary = "\n".join([f"- {format_month(m)}: {data['monthly_totals'].get(m, 0):,.0f} SEK" for m in months])
+                        return f"{MONTH_ABBR[int(m[5:7])]} {m[:4]}"
+                    monthly_sales_summary = "\n".join([f"- {format_month(m)}: {monthly_totals[m]:,.0f} SEK" for m in months])
                     
                     # Top churned
                     top_churned = "\n".join([f"- {c['kund']}: {c['previous']:,.0f} SEK (last order: {c.get('last_month', 'unknown')})" for c in cohorts['churned'][:3]])
@@ -1802,7 +2090,7 @@ else:
                         'prev_ltm': prev_ltm,
                         'yoy_chg': total_ltm - prev_ltm,
                         'yoy_pct': ((total_ltm - prev_ltm) / prev_ltm * 100) if prev_ltm > 0 else 0,
-                        'active_customers': len([c for c in data['customers'] if c['ltm'].get(curr, 0) > 0]),
+                        'active_customers': cohorts['active_count'],
                         'churned_count': len(cohorts['churned']),
                         'churn_loss': sum(c['previous'] for c in cohorts['churned']),
                         'new_count': len(cohorts['new']),
@@ -1817,7 +2105,7 @@ else:
                         'at_risk_summary': at_risk_summary,
                         'top_growing': top_growing,
                         'churn_timeline_summary': churn_timeline_summary,
-                        'concentration_pct': (sum(c['ltm'].get(curr, 0) for c in sorted(data['customers'], key=lambda x: x['ltm'].get(curr, 0), reverse=True)[:20]) / total_ltm * 100) if total_ltm > 0 else 0,
+                        'concentration_pct': (sum(c['current'] for c in get_top20_cust(data, curr, prev)) / total_ltm * 100) if total_ltm > 0 else 0,
                         'industry_analysis': industry_analysis,
                         'industry_data': industry_data
                     }
@@ -1842,7 +2130,6 @@ else:
                 else: st.error("Could not find LTM data in file")
             except Exception as e:
                 st.error(str(e))
-                import traceback
                 st.code(traceback.format_exc())
     
     if 'intel_html' in st.session_state:
@@ -1856,30 +2143,13 @@ else:
         with c1: st.metric("LTM Sales", f"{total/1e6:.1f}M SEK")
         with c2: st.metric("YoY Change", f"{yoy:+.1f}%")
         with c3: st.metric("Articles", f"{len(data['articles']):,}")
-        with c4: st.metric("Customers", f"{len([c for c in data['customers'] if c['ltm'].get(curr,0)>0]):,}")
+        with c4: st.metric("Customers", f"{int(np.count_nonzero(ltm_column(data, curr) > 0)):,}")
         st.markdown("---")
         st.download_button(label="📊 Download Dashboard (HTML)", data=st.session_state['intel_html'], file_name=f"HYAB_Dashboard_{datetime.now().strftime('%Y%m%d')}.html", mime="text/html", use_container_width=True)
-        st.markdown('<div style="background:#F0FDF4;border-left:3px solid #16A34A;padding:12px 16px;margin-top:16px;"><strong>✓ Dashboard includes:</strong><br><span style="font-size:13px;color:#666;">• Rolling LTM trend chart<br>• Monthly sales bar chart<br>• Year-over-Year comparison by month<br>• Revenue bridge visualization<br>• Customer cohorts (Churned, Declining, Growing, New)<br>• Top 20 Customers with YoY change<br>• Top 20 Articles<br>• AI-generated insights (if API key provided)</span></div>', unsafe_allow_html=True)
+        st.success(DASHBOARD_CONTENTS_MD, icon="✅")
 
 st.markdown("---")
 
-with st.expander("What does each mode do?"):
-    st.markdown("""
-**Order Book** — Clean and analyze your weekly order book export from Briox.
-- Converts all currencies to SEK using your exchange rates
-- Highlights partially invoiced orders
-- Shows aging alerts for orders >90 days old
-- Week-over-week comparison (if you upload last week's file)
-
-**Sales** — Process monthly sales data for the master file.
-- Parses Article and Company sheets
-- Calculates Top 20 concentration
-- Prepares data for pasting into Sales_work_file.xlsx
-
-**Intelligence** — Generate a full analytics dashboard from your master file.
-- Upload Sales_work_file.xlsx to create a downloadable HTML report
-- Includes LTM trends, YoY comparisons, customer cohorts, Top 20 analysis
-- Share the HTML with Colin or anyone — opens in any browser
-    """)
-
-st.markdown('<div style="text-align:center;color:#6B7280;font-size:12px;">HYAB Data Cleaner v3.0 · Built for Victor</div>', unsafe_allow_html=True)
+_modes_help()
+
+st.caption("HYAB Data Cleaner v3.0 · Built for Victor")
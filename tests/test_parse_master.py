@@ -0,0 +1,51 @@
+import importlib.util
+import json
+import re
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import openpyxl
+
+_spec = importlib.util.spec_from_file_location("hyab", Path(__file__).resolve().parent.parent / "hyab_data_cleaner_v6.2.py")
+hyab = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(hyab)
+
+
+def _master(rows, ltm_headers=('LTM 25-nov',)):
+    """Master workbook with a customer sheet: [nr, name, Nov 25, *LTM, FY25] per row"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Försäljning per kund'
+    ws.append(['Kundnr', 'Kund', datetime(2025, 11, 1), *ltm_headers, 'FY25'])
+    for row in rows: ws.append(row)
+    buf = BytesIO()
+    wb.save(buf)
+    wb = openpyxl.load_workbook(BytesIO(buf.getvalue()), read_only=True, data_only=True)
+    try:
+        return hyab.parse_master(wb)
+    finally:
+        wb.close()
+
+
+def test_text_numbers_are_not_revenue():
+    rows = [[1, 'Alfa AB', 1000, 1001, 1000],
+            [2, 'Beta AB', '120000', '120000', ' 7 ']]
+    data = _master(rows)
+    assert list(data['customer_names']) == ['Alfa AB']
+    assert data['ltm_trend'] == {'LTM 25-nov': 1001}
+
+
+def test_unrelated_text_cell_does_not_change_result():
+    rows = [[1, 'Alfa AB', 1000, 1001, 1000],
+            [2, 'Beta AB', '120000', '120000', 'n/a']]
+    assert _master(rows)['ltm_trend'] == {'LTM 25-nov': 1001}
+
+
+def test_unparseable_ltm_header_is_not_plotted():
+    rows = [[1, 'Alfa AB', 1000, 900, 1001, 5, 1000]]
+    data = _master(rows, ltm_headers=('LTM 24-nov', 'LTM 25-nov', 'LTM bogus'))
+    html = hyab.generate_html(data, 'LTM 25-nov', 'LTM 24-nov')
+    charts = json.loads(re.search(r'id="chartData">(.*?)</script>', html, re.DOTALL).group(1))
+    assert charts['ltm']['labels'] == ['Nov 24', 'Nov 25']
+    assert charts['ltm']['values'] == [900, 1001]